@@ -4,20 +4,34 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import math
 import warnings
+import argparse
+import ckd_common
+import ckd_executor
+import ckd_profiling
+import ckd_stages
+import ckd_store
 warnings.filterwarnings("ignore")
 
+parser = argparse.ArgumentParser(description="Chronic kidney disease analysis")
+ckd_profiling.add_arguments(parser)
+ckd_executor.add_arguments(parser)
+#parse_known_args so that the notebook kernel's own arguments are ignored
+args, _ = parser.parse_known_args()
+ckd_profiling.enable_from_args(args)
+#The independent fits (transformers, imputations, model grid, boosting, networks) run as tasks of this executor
+executor=ckd_executor.from_args(args)
+
 """# Pre-processing
 
 ### A bit of exploration
 """
 
-feature_names=['Age (yrs)','Blood Pressure (mm/Hg)','Specific Gravity','Albumin','Sugar','Red Blood Cells',
-               'Pus Cells','Pus Cell Clumps','Bacteria','Blood Glucose Random (mgs/dL)','Blood Urea (mgs/dL)',
-               'Serum Creatinine (mgs/dL)','Sodium (mEq/L)','Potassium (mEq/L)','Hemoglobin (gms)','Packed Cell Volume',
-               'White Blood Cells (cells/cmm)','Red Blood Cells (millions/cmm)','Hypertension','Diabetes Mellitus',
-               'Coronary Artery Disease','Appetite','Pedal Edema','Anemia','Chronic Kidney Disease']
+#The feature names, cleaning steps, transformers and models are shared with the other tools through ckd_common
+feature_names=ckd_common.feature_names
                
+span=ckd_profiling.stage("Loading")
 data=pd.read_csv("chronic_kidney_disease.csv", names = feature_names)
+span.stop(rows=data.shape[0])
 
 data.head()
 
@@ -45,43 +59,16 @@ data.describe()
 Let's deal with typos first.
 """
 
-#Correcting some typos in the dataset
-for i in range(data.shape[0]):
-    if data.iloc[i,24]=='ckd\t':
-        data.iloc[i,24]='ckd'
-    if data.iloc[i,19] in [' yes','\tyes']:
-        data.iloc[i,19]='yes'
-    if data.iloc[i,19]=='\tno':
-        data.iloc[i,19]='no'
-    if data.iloc[i,20]=='\tno':
-        data.iloc[i,20]='no'
-    if data.iloc[i,15]=='\t?':
-        data.iloc[i,15]=np.nan
-    if data.iloc[i,15]=='\t43':
-        data.iloc[i,15]='43'
-    if data.iloc[i,16]=='\t?':
-        data.iloc[i,16]=np.nan
-    if data.iloc[i,16]=='\t6200':
-        data.iloc[i,16]= '6200'
-    if data.iloc[i,16]=='\t8400':
-        data.iloc[i,16]= '6200'
-    if data.iloc[i,17]=='\t?':
-        data.iloc[i,17]=np.nan
-    if data.iloc[i,24]=='ckd':
-        data.iloc[i,24]='yes'
-    if data.iloc[i,24]=='notckd':
-        data.iloc[i,24]='no'
+#Correcting some typos in the dataset (see ckd_common.typo_fixes for the tokens of each column)
+span=ckd_profiling.stage("Typo cleaning", rows=data.shape[0])
+data=ckd_common.fix_typos(data)
+span.stop()
 
 #One-hot encoding some categorical features, some categorical features must not be encoded since they are ordinal
-data.replace({ 'normal' : 1, 'abnormal' : 0}, inplace = True)
-data.replace({ 'present' : 1, 'notpresent' : 0}, inplace = True)
-data.replace({ 'yes' : 1, '\tyes':1, ' yes':1, '\tno':0, 'no' : 0}, inplace = True)
-data.replace({ 'good' : 1, 'poor' : 0}, inplace = True)
-data.replace({ 'ckd' : 1, 'ckd\t':1, 'notckd' : 0}, inplace = True)
-
-#Replacing missing values with NaN
-data.replace('\t?',np.nan, inplace = True)        
-data.replace('?',np.nan, inplace = True)
+#Missing values ('?' and '\t?') are replaced with NaN along the way (see ckd_common.encodings)
+span=ckd_profiling.stage("Replace encoding", rows=data.shape[0])
+data=data.replace(ckd_common.encodings)
+span.stop()
 
 data.head()
 
@@ -93,20 +80,18 @@ data.dtypes
 
 """
 
+span=ckd_profiling.stage("Float conversion", rows=data.shape[0])
 for col in data.columns:
         data[col]=data[col].astype('float')
+span.stop()
 
 data.info()
 
 """Now that we've dealt with that, let's separate categorical and numerical features, as they won't be dealt with the same way.  """
 
 #Creating two lists of numerical and categorical features
-numeric = ['Age (yrs)','Specific Gravity','Albumin','Sugar', 'Blood Pressure (mm/Hg)', 'Blood Glucose Random (mgs/dL)', 'Blood Urea (mgs/dL)', 'Serum Creatinine (mgs/dL)', 'Sodium (mEq/L)', 'Potassium (mEq/L)', 'Hemoglobin (gms)', 'Packed Cell Volume', 'White Blood Cells (cells/cmm)', 'Red Blood Cells (millions/cmm)']
-categoricals=[]
-for col in data.columns:
-    if not col in numeric:
-        categoricals.append(col)
-categoricals.remove('Chronic Kidney Disease')
+numeric=ckd_common.numeric
+categoricals=ckd_common.categoricals
 
 """###### Note:
 Note that Specific Gravity, Albumin and Sugar basically are categorical features. But because they're ordinal, they will be preprocessed as numerical.
@@ -127,6 +112,7 @@ We'll start by visualizing feature distributions.
 import matplotlib.style as style
 style.use('fivethirtyeight')
 
+span=ckd_profiling.stage("Numerical distribution plots", rows=data.shape[0])
 n_rows, n_cols = (int(len(numeric)/2),2) #Since we have 14 numerical features in total
 #Initializing the subplot
 figure, axes = plt.subplots(nrows=n_rows, ncols=n_cols,figsize=(20, 50))
@@ -154,6 +140,7 @@ for index, column in enumerate(numeric):
     axes[i,j].set_xlabel(None)
 
 plt.show()
+span.stop()
 
 """##### Notes:
 Some features show some very distant outliers.  
@@ -168,6 +155,7 @@ Let's take a look at categorical features now.
 
 style.use('seaborn-darkgrid')
 
+span=ckd_profiling.stage("Categorical countplots", rows=data.shape[0])
 n_rows, n_cols = (int(len(categoricals)/2),2) #Since we have 10 categorical features in total
 
 #Initializing the subplot
@@ -198,6 +186,7 @@ for index, column in enumerate(categoricals):
     axes[i,j].set_xticklabels(axes[i,j].get_xticklabels())
 
 plt.show()
+span.stop()
 
 """##### Notes:
 Some features have very high percentages of missing values while some have almost none.  
@@ -206,6 +195,7 @@ this sample of 400 people may not well-represent the population of India (which
 
 """
 
+span=ckd_profiling.stage("Target countplot", rows=data.shape[0])
 #Calculating the missing values percentage of the target
 miss_perc="%.2f"%(100*(1-(data['Chronic Kidney Disease'].dropna().shape[0])/data.shape[0]))
     
@@ -215,6 +205,7 @@ label="Disease\n(missing:\n{}%)".format(miss_perc)
 fig=sns.countplot(x=data['Chronic Kidney Disease'],label=label, palette=sns.cubehelix_palette(rot=-.35,light=0.85,hue=1))
 plt.title("Disease\n({}% is missing)".format(miss_perc))
 plt.show()
+span.stop()
 
 """##### Notes:
 We can see there are 0 missing values in the target, which is logical because this is not a semi-supervised problem.
@@ -226,6 +217,7 @@ Let's take a look at missing values.
 
 style.use('seaborn-darkgrid')
 
+span=ckd_profiling.stage("Missing values plot", rows=data.shape[0])
 d=((data.isnull().sum()/data.shape[0])).sort_values(ascending=False)
 d.plot(kind='bar',
        color=sns.cubehelix_palette(start=2,
@@ -237,13 +229,10 @@ d.plot(kind='bar',
         figsize=(20,10))
 plt.title("\nProportions of Missing Values:\n")
 plt.show()
+span.stop()
 
 """### Data Transformations"""
 from sklearn.pipeline import make_pipeline
-from sklearn.preprocessing import QuantileTransformer
-from sklearn.preprocessing import PowerTransformer
-from sklearn.preprocessing import StandardScaler
-from sklearn.preprocessing import RobustScaler
 from sklearn.preprocessing import MinMaxScaler
 
 """The Quantile Transformer transforms a distribution into a normal or uniform one. We will be trying both.  
@@ -253,16 +242,12 @@ RobustScaler centers data but, instead of dividing by the standard deviation, it
 You can either specify the inter-quantile range or just leave it to default, which is [25,75].
 """
 
-NQT=QuantileTransformer(output_distribution='normal')
-UQT=QuantileTransformer(output_distribution='uniform')
-SPT=PowerTransformer()
-RS=RobustScaler() #default
-WRS=RobustScaler(quantile_range=(15,85)) # a "wider" range
-SS=StandardScaler()
-
-Transformers=[NQT,UQT,SPT,RS,WRS,SS]
-tr_names = ['Normal Quantile Transformer', 'Uniform Quantile Transformer', 'Power Transformer', 'Robust Scaler', 'Wide Robust Scaler', 'Standard Scaler']
+#Normal and uniform quantile transformers, power transformer, default and "wider" (15-85) robust scalers, standard scaler
+Transformers=ckd_common.make_transformers()
+NQT,UQT,SPT,RS,WRS,SS=Transformers
+tr_names=ckd_common.tr_names
 
+span=ckd_profiling.stage("Transformations", rows=data.shape[0])
 #Seperating the dataset into numerical and categorical datasets
 categorical_feats = pd.DataFrame()
 numeric_feats = pd.DataFrame()
@@ -274,18 +259,22 @@ for col in numeric:
 #Ordering the variables by their type (numerical/categorical)
 data = pd.concat([numeric_feats, categorical_feats, data['Chronic Kidney Disease']], axis = 1)
 
-#Applying each transformer to the numerical features and storing all the outcomes in a list of arrays
-datarrays=[]
-for tr in Transformers:
-    arr=tr.fit_transform(numeric_feats)
-    datarrays.append(arr)
-
-#Creating a DataFrame for each outcome and storing them in a list
-dataframes=[numeric_feats]
-for arr in datarrays:
-    df=pd.DataFrame(arr,columns=numeric_feats.columns)
-    df = pd.concat([df, categorical_feats, data['Chronic Kidney Disease']], axis = 1)
-    dataframes.append(df)
+#The untransformed dataset and the outcome of each transformer are stored in a single memory-mapped
+#(variant, row, feature) float32 array, written one variant at a time
+variants=['Original']+tr_names
+untouched=categoricals+['Chronic Kidney Disease']
+transformed=ckd_store.TensorStore.create('transformed', variants, data.columns, data.shape[0])
+transformed.write('Original', data)
+
+#Applying each transformer to the numerical features, the categorical ones are copied as they are
+#(each output is written to the store as soon as it is ready, so only a few exist at a time)
+outputs=executor.imap(ckd_executor.fit_transform, [(tr, numeric_feats) for tr in Transformers], seed=args.seed,
+                      name="Transformer fit", tags=[{"transformer": tr_name} for tr_name in tr_names],
+                      rows=numeric_feats.shape[0])
+for tr_name, output in zip(tr_names, outputs):
+    transformed.write(tr_name, output, columns=numeric)
+    transformed.write(tr_name, data[untouched], columns=untouched)
+span.stop()
 
 """Let's take a look at what these transformations did to our data.  
 P.S: the second (blue) robustscaler is the wider one, and the first (orange) powertransformer is the normalized one.
@@ -295,6 +284,7 @@ style.use('fivethirtyeight')
 
 colors=['crimson','steelblue','darkorange','darkviolet','gold','mediumblue','lime']
 
+span=ckd_profiling.stage("Transformation plots", rows=data.shape[0])
 n_rows, n_cols = (len(numeric),7) #Since we have 14 numerical features and 6 transformers(+the untransformed dataset)
 
 #Initializing the subplots
@@ -319,7 +309,7 @@ for j in range(1,7):
         label=tr_names[j-1]
         
         #Visualizing the distribution of each numerical feature after each transformation
-        fig = sns.distplot(dataframes[j][col], color=colors[j-1], label=label, norm_hist=True,
+        fig = sns.distplot(transformed.series(j, col), color=colors[j-1], label=label, norm_hist=True,
 
         ax=axes[i,j], kde_kws={"lw":4})
         
@@ -330,6 +320,7 @@ for j in range(1,7):
         axes[i,j].set_xlabel(axes[i,j].get_xlabel())
 
 plt.show()
+span.stop()
 
 """##### Notes:
 Both quantile transformers did a very decent job (despite the piles of outliers mentionned earlier)  
@@ -349,17 +340,21 @@ from sklearn.impute import KNNImputer
 
 knnimp=KNNImputer(weights='distance', n_neighbors=8)
 
-#Imputing the original dataset
-data_imp = knnimp.fit_transform(data)
+span=ckd_profiling.stage("Imputation", rows=data.shape[0])
+#The imputed datasets go to a second store, with the same layout
+imputed=ckd_store.TensorStore.create('imputed', variants, data.columns, data.shape[0])
 
-#Imputing the transformed datasets
-rrr=[data.to_numpy()]
-for dfi in range(1,len(dataframes)):
-    rrr.append(knnimp.fit_transform(dataframes[dfi]))
+#Imputing the original dataset and the transformed ones, straight from their memory-mapped views
+frames=(data if variant=='Original' else transformed.frame(variant) for variant in variants)
+outputs=executor.imap(ckd_executor.fit_transform, ((knnimp, frame) for frame in frames),
+                      name="KNN imputation", tags=[{"variant": variant} for variant in variants],
+                      rows=data.shape[0])
+for variant, output in zip(variants, outputs):
+    imputed.write(variant, output)
+data_imp = imputed.variant('Original')
+span.stop()
 
-impdf=[]
-for i in range(len(rrr)):
-    impdf.append(pd.DataFrame(rrr[i],columns=data.columns))
+span=ckd_profiling.stage("Imputation plots", rows=data.shape[0])
 
 n_rows, n_cols = (len(numeric),7)
 
@@ -380,7 +375,7 @@ for j in range(1,7):
     for i, col in enumerate(numeric):
         label=tr_names[j-1]
         
-        fig = sns.distplot(impdf[j][col], color=colors[j-1], label=label, norm_hist=True,
+        fig = sns.distplot(imputed.series(j, col), color=colors[j-1], label=label, norm_hist=True,
 
         ax=axes[i,j], kde_kws={"lw":4})
         
@@ -391,12 +386,14 @@ for j in range(1,7):
         axes[i,j].set_xlabel(axes[i,j].get_xlabel())
 
 plt.show()
+span.stop()
 
 """Finally, we can conclude that the transformer that best kept the distribution of the data is the wide robust scaler, which is pretty logical since we have a few bust serious outliers
 
 # Exploratory Data Analysis
 """
 
+span=ckd_profiling.stage("EDA plots", rows=data.shape[0])
 style.use('seaborn-darkgrid')
 
 n_rows, n_cols = (10,2)
@@ -582,9 +579,11 @@ for i in range(14):
     for j in range(10):
         graph=sns.violinplot(y=numeric[i],x=categoricals[j],data=data,color=colors3[j%4],ax=axes[i,j])
 plt.show()
+span.stop()
 
 """ Prediction"""
 
+span=ckd_profiling.stage("Scaling and split", rows=data_imp.shape[0])
 X=data_imp[:,:24]
 Y=data_imp[:,24]
 
@@ -593,6 +592,7 @@ scaled_data=WRS.fit_transform(X)
 
 from sklearn.model_selection import train_test_split
 X_train, X_test, Y_train, Y_test = train_test_split(scaled_data, Y, test_size=0.2, random_state=12)
+span.stop()
 
 """### Linear-Kernel SVC
 
@@ -604,6 +604,7 @@ from sklearn.svm import SVC
 from sklearn.metrics import accuracy_score
 from sklearn.decomposition import PCA
 
+span=ckd_profiling.stage("LDA sweep", rows=X_train.shape[0])
 lin_svc=SVC(kernel='linear')
 
 n_rows, n_cols= 12,2
@@ -616,6 +617,8 @@ for index in range(24):
     
     i,j = (index // n_cols), (index % n_cols)
     
+    it=ckd_profiling.stage("LDA sweep iteration", rows=X_train.shape[0], n_components=index+1)
+    
     pca=PCA(n_components=index+1)
     
     lda=LinearDiscriminantAnalysis()
@@ -647,44 +650,23 @@ for index in range(24):
     
     axes[i,j].set_xticklabels(["CKD","No CKD"])
     
+    it.stop()
+    
 plt.show()
+span.stop()
 
 """Low variance despite the fact that the testing set is 0.2 of the whole dataset, which only has 400 samples.
 
 ### Evaluating A Few Other Models
 """
 
-from sklearn.neighbors import KNeighborsClassifier
-from sklearn.naive_bayes import GaussianNB
-from sklearn.linear_model import LogisticRegression
-from sklearn.tree import DecisionTreeClassifier
-from sklearn.ensemble import RandomForestClassifier
-
-SVM_RBF=SVC()
-    
-SVM_Poly2=SVC(kernel='poly',degree=2)
-    
-SVM_Poly3=SVC(kernel='poly',degree=3)
-
-KNN3=KNeighborsClassifier(n_neighbors=3,weights='distance')
-
-KNN8=KNeighborsClassifier(n_neighbors=8,weights='distance')
-
-KNN15=KNeighborsClassifier(n_neighbors=15,weights='distance')
-
-Naive_Bayes=GaussianNB()
-
-LogReg=LogisticRegression()
+#SVMs (RBF, polynomial of degree 2 and 3), distance-weighted KNNs (3, 8 and 15 neighbors), naive Bayes,
+#logistic regression, decision tree and random forest
+models=ckd_common.make_models()
 
-Tree=DecisionTreeClassifier()
-
-Forest=RandomForestClassifier()
-
-models=[SVM_RBF,SVM_Poly2,SVM_Poly3,KNN3,KNN8,KNN15,Naive_Bayes,LogReg,Tree,Forest]
-
-names=["SVM_RBF","SVM_Poly2","SVM_Poly3","Weighted 3NearestNeighbors","Weighted 8NearestNeighbors",
-       "Weighted 15NearestNeighbors","Naive Bayes","Logistic Regression","Decision Tree","Random Forest"]
+names=ckd_common.names
 
+span=ckd_profiling.stage("Model grid", rows=X_train.shape[0])
 n_rows, n_cols= 10,1
 
 figure, axes = plt.subplots(nrows=n_rows,ncols= n_cols, figsize=(30, 120))
@@ -707,32 +689,22 @@ mask=mask.reshape((48,))
 
 cmps=[i for i in range(1,25)] * 2
 
+#Every (model, number of components) pair is fitted as an independent task
+grid=[(index, n_comps) for index in range(10) for n_comps in range(1,25)]
+
+scores=executor.map(ckd_executor.fit_score,
+                    [(make_pipeline(PCA(n_components=n_comps), models[index]), X_train, Y_train, X_test, Y_test)
+                     for index, n_comps in grid],
+                    seed=args.seed, name="Model grid iteration",
+                    tags=[{"model": names[index], "n_components": n_comps} for index, n_comps in grid],
+                    rows=X_train.shape[0])
+
 
 for index in range(10):
     
-    pca_tr_acc=[]
-    
-    pca_ts_acc=[]
+    pca_tr_acc=[train_acc for (i, _), (train_acc, _) in zip(grid, scores) if i == index]
     
-    
-    for n_comps in range(1,25):
-        
-        model=models[index]
-        
-        pca=PCA(n_components=n_comps)
-        
-        pca_model=make_pipeline(pca,model)
-        
-        pca_model.fit(X_train,Y_train)
-        
-        y_tr_pred= pca_model.predict(X_train)
-        
-        pca_tr_acc.append(accuracy_score(y_tr_pred,Y_train))
-        
-        y_ts_pred=pca_model.predict(X_test)
-        
-        pca_ts_acc.append(accuracy_score(y_ts_pred,Y_test))
-        
+    pca_ts_acc=[test_acc for (i, _), (_, test_acc) in zip(grid, scores) if i == index]
     
     model_data = pd.DataFrame()
     
@@ -751,21 +723,18 @@ for index in range(10):
     
     
 plt.show()
+span.stop()
 
-from sklearn.ensemble import AdaBoostClassifier
+#AdaBoost (SAMME) around the SVMs, naive Bayes, logistic regression, decision tree and random forest
+boosters = ckd_common.make_boost_models()
 
-boost_models = [SVC(),
- SVC(degree=2, kernel='poly'),
- SVC(kernel='poly'),
- GaussianNB(),
- LogisticRegression(),
- DecisionTreeClassifier(),
- RandomForestClassifier()]
-
-for mod in boost_models:
-  booster = AdaBoostClassifier(base_estimator = mod, algorithm = 'SAMME')
-  booster.fit(X_train, Y_train)
-  print(mod, booster.score(X_test, Y_test))
+span=ckd_profiling.stage("Boosting", rows=X_train.shape[0])
+boost_scores = executor.map(ckd_executor.fit_score, [(booster, X_train, Y_train, X_test, Y_test) for booster in boosters],
+                            seed=args.seed, name="Boosting iteration", tags=[{"model": name} for name in ckd_common.boost_names],
+                            rows=X_train.shape[0])
+for name, (train_acc, test_acc) in zip(ckd_common.boost_names, boost_scores):
+  print(name, test_acc)
+span.stop()
 
 """As we can see the models didn't really improve comparing to the ones without boosting
 
@@ -774,15 +743,6 @@ for mod in boost_models:
 So We will be trying a small neural network with one hidden layer containing 4 neurons, and a bigger one with 3 hidden layers and lots of neurons.
 """
 
-import tensorflow
-from tensorflow.keras.layers import Dense
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.callbacks import EarlyStopping
-from tensorflow.keras.utils import to_categorical
-
-early_stopping_monitor = EarlyStopping(patience=5, monitor='accuracy')
-Y_net = to_categorical(Y)
-
 pca_tr_acc_1=[]
     
 pca_ts_acc_1=[]
@@ -793,59 +753,23 @@ pca_tr_acc_2=[]
 pca_ts_acc_2=[]
 
 
-for i in range(1,25):
-    
-    pca=PCA(n_components=i)
-    
-    X_pca=pca.fit_transform(scaled_data)
-    
-    X_pca_train, X_pca_test, Y_train, Y_test = train_test_split(X_pca, Y_net, test_size=0.25, random_state=12)
-    
-    #little net
-    net1= Sequential()
-    
-    net1.add(Dense(4, activation='relu', input_shape = (i,)))
-    
-    net1.add(Dense(2, activation='softmax'))
-    
-    net1.compile(optimizer='adam',loss='binary_crossentropy',metrics=['accuracy'])
-    
-    net1.fit(X_pca_train, Y_train, epochs=50, callbacks=[early_stopping_monitor], verbose=0)
-    
-    y_tr_pred=net1.predict(X_pca_train)
-    
-    pca_tr_acc_1.append(accuracy_score(np.argmax(y_tr_pred, axis=1),Y_train[:,1]))
-    
-    y_ts_pred=net1.predict(X_pca_test)
-    
-    pca_ts_acc_1.append(accuracy_score(np.argmax(y_ts_pred, axis=1),Y_test[:,1]))
-    
-    
-    
-    #big net
-    net2= Sequential()
-    
-    net2.add(Dense(50, activation='relu', input_shape = (i,)))
-    
-    net2.add(Dense(30, activation='relu'))
-    
-    net2.add(Dense(20, activation='relu'))
-    
-    net2.add(Dense(10, activation='relu'))
-    
-    net2.add(Dense(2, activation='softmax'))
-    
-    net2.compile(optimizer='adam',loss='binary_crossentropy',metrics=['accuracy'])
-    
-    net2.fit(X_pca_train, Y_train, epochs=100, callbacks=[early_stopping_monitor], verbose=0)
+span=ckd_profiling.stage("NN sweep", rows=scaled_data.shape[0])
+#One task per number of components, training both nets on a 75/25 split (the Keras code is in ckd_stages,
+#so that process and socket workers can import it)
+points=executor.map(ckd_stages.nn_point, [(scaled_data, Y, i, 0.25, 12) for i in range(1,25)], seed=args.seed,
+                    name="NN sweep iteration", tags=[{"n_components": i} for i in range(1,25)],
+                    rows=scaled_data.shape[0])
+
+for little_net, big_net in points:
     
-    y_tr_pred=net2.predict(X_pca_train)
+    pca_tr_acc_1.append(little_net["train_accuracy"])
     
-    pca_tr_acc_2.append(accuracy_score(np.argmax(y_tr_pred, axis=1),Y_train[:,1]))
+    pca_ts_acc_1.append(little_net["test_accuracy"])
     
-    y_ts_pred=net2.predict(X_pca_test)
+    pca_tr_acc_2.append(big_net["train_accuracy"])
     
-    pca_ts_acc_2.append(accuracy_score(np.argmax(y_ts_pred, axis=1),Y_test[:,1]))
+    pca_ts_acc_2.append(big_net["test_accuracy"])
+span.stop()
 
 tr_mask = np.empty(shape=(24,1),dtype="object")
     
@@ -875,6 +799,7 @@ net2_data["PCA"] = pca_tr_acc_2 + pca_ts_acc_2
 
 net2_data["Results"] = mask
 
+span=ckd_profiling.stage("NN plots")
 n_rows, n_cols= 1,2
 
 figure, axes = plt.subplots(nrows=n_rows,ncols= n_cols, figsize=(30, 10))
@@ -906,3 +831,5 @@ axes[1].set_ylabel("Accuracy")
 axes[1].set_xticklabels(axes[1].get_xticklabels())
 
 plt.show()
+span.stop()
+executor.close()
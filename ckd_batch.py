@@ -0,0 +1,259 @@
+"""Batch runs of the cleaning -> imputation -> evaluation pipeline over many cohorts.
+
+Each hospital site comes as its own CKD file (same raw format as the UCI one).
+Given a directory or glob patterns, every cohort is run through the pipeline of
+ckd_cv (cleaning, per-fold KNN imputation, scaling and PCA, then the model x
+PCA grid) in a pool of worker processes:
+
+- at most --workers cohorts run at a time, and each worker process is reused
+  for many cohorts, so pandas/sklearn are imported once per worker, not once
+  per cohort;
+- cohorts are started largest first, and only while the estimated memory of
+  the running ones (proportional to their file size) fits in the budget
+  (--memory-limit, or a fraction of the available memory);
+- a failing cohort is reported as such without stopping the batch; if a
+  worker process dies (e.g. killed for lack of memory), the pool cannot tell
+  whose it was: the cohorts it was running are queued again, and a new pool
+  with half the workers and half the memory budget takes over. A cohort is
+  only reported as failed once it killed its worker --max-attempts times,
+  the last time running on its own.
+
+Per-cohort accuracies and timings are merged into one report.
+
+Usage:
+    python ckd_batch.py "sites/*.csv" --workers 4 --out batch_report.csv
+"""
+
+import argparse
+import glob
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+#Rough peak memory of a cohort run per byte of raw CSV (parsing, cleaning, imputation, folds)
+memory_per_byte = 40
+#Fixed overhead of a cohort run, in bytes
+memory_overhead = 200 * 2**20
+
+
+def find_cohorts(patterns):
+    """CSV files matching the given directories or glob patterns, without duplicates."""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, "*.csv")
+        paths += sorted(glob.glob(pattern))
+    return list(dict.fromkeys(os.path.abspath(path) for path in paths))
+
+
+def available_memory():
+    """Available memory in bytes (None if it cannot be told)."""
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def estimate_memory(path):
+    return memory_overhead + memory_per_byte * os.path.getsize(path)
+
+
+def _warm_up():
+    #Runs once in every worker process: the heavy imports happen here, not per cohort
+    import ckd_cv  # noqa: F401
+
+
+def cohort_names(paths):
+    """Unique name of every cohort: its path relative to the cohorts' common directory.
+
+    sites/a/cohort.csv and sites/b/cohort.csv are a/cohort and b/cohort; the extension is only
+    kept when it is needed to tell two files apart.
+    """
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths]) if paths else ""
+    relative = [os.path.relpath(os.path.abspath(path), root).replace(os.sep, "/") for path in paths]
+    stems = [os.path.splitext(name)[0] for name in relative]
+    names = stems if len(set(stems)) == len(stems) else relative
+    return dict(zip(paths, names))
+
+
+def run_cohort(path, name, options):
+    """Runs one cohort; returns its results, or the error if it failed."""
+    import ckd_cv
+
+    out = {"cohort": name, "path": path, "pid": os.getpid()}
+    try:
+        start = time.perf_counter()
+        X, y = ckd_cv.load_xy(path)
+        out["rows"] = len(y)
+        out["load_seconds"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        results, fold_info = ckd_cv.cross_validate(X, y,
+                                                   candidates=ckd_cv.default_candidates(options["boost"]),
+                                                   components=range(1, options["max_components"] + 1),
+                                                   n_splits=options["splits"],
+                                                   n_repeats=options["repeats"],
+                                                   n_jobs=1,
+                                                   cache_dir=options["cache_dir"],
+                                                   random_state=options["seed"])
+        out["evaluate_seconds"] = time.perf_counter() - start
+        out["preprocess_seconds"] = fold_info["preprocess_seconds"].sum()
+        out["summary"] = ckd_cv.summarize(results)
+    except Exception:
+        out["error"] = traceback.format_exc(limit=3)
+    return out
+
+
+def run_batch(paths, options, workers=None, memory_limit=None, max_attempts=3, verbose=True):
+    """Runs every cohort in a process pool with bounded concurrency and memory.
+
+    Returns the list of per-cohort outputs of `run_cohort`, in completion order.
+    """
+    workers = workers or os.cpu_count()
+    if memory_limit is None:
+        available = available_memory()
+        memory_limit = 0.7 * available if available else float("inf")
+
+    names = cohort_names(paths)
+    pending = sorted(paths, key=os.path.getsize, reverse=True)
+    running = {}
+    outputs = []
+    #Pools each cohort was running in when a worker died
+    attempts = dict.fromkeys(paths, 0)
+
+    def collect(future, path, alone):
+        """Records the output of a finished cohort; returns True if its pool broke.
+
+        A cohort lost with a broken pool goes back to `pending`, unless it was running `alone`
+        and has used up its attempts.
+        """
+        try:
+            out = future.result()
+            out["attempts"] = attempts[path] + 1
+        except BrokenProcessPool:
+            attempts[path] += 1
+            if not alone or attempts[path] < max_attempts:
+                if verbose:
+                    print("{}: worker died, queued again (attempt {} of {})".format(
+                        names[path], attempts[path], max_attempts), flush=True)
+                pending.append(path)
+                return True
+            out = {"cohort": names[path], "path": path, "attempts": attempts[path],
+                   "error": "its worker process died {} times, the last time running alone "
+                            "(killed, or out of memory?)".format(attempts[path])}
+        outputs.append(out)
+        if verbose:
+            if "error" in out:
+                print("{}: FAILED\n{}".format(out["cohort"], out["error"]), flush=True)
+            else:
+                best = out["summary"].iloc[0]
+                print("{}: {} rows in {:.1f}s, best {} ({} components) {:.4f}".format(
+                    out["cohort"], out["rows"], out["load_seconds"] + out["evaluate_seconds"],
+                    best["model"], best["n_components"], best["mean_accuracy"]), flush=True)
+        return False
+
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_up)
+    try:
+        while pending or running:
+            #Start cohorts while there is a free worker and memory to spare (always at least one)
+            while pending and len(running) < workers:
+                budget_used = sum(memory for _, memory in running.values())
+                candidates = [path for path in pending
+                              if not running or budget_used + estimate_memory(path) <= memory_limit]
+                if not candidates:
+                    break
+                path = candidates[0]
+                pending.remove(path)
+                running[pool.submit(run_cohort, path, names[path], options)] = (path, estimate_memory(path))
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            if any(isinstance(future.exception(), BrokenProcessPool) for future in done):
+                #The other futures of the broken pool fail right away: wait for all of them
+                wait(running)
+                done = list(running)
+            alone = len(running) == 1
+            broken = False
+            for future in done:
+                path, _ = running.pop(future)
+                broken = collect(future, path, alone) or broken
+            if broken:
+                #Fewer cohorts at a time in the new pool, so that a cohort that keeps dying ends up alone
+                workers = max(workers // 2, 1)
+                memory_limit /= 2
+                pending.sort(key=os.path.getsize, reverse=True)
+                pool.shutdown(wait=False)
+                pool = ProcessPoolExecutor(max_workers=workers, initializer=_warm_up)
+    finally:
+        pool.shutdown()
+    return outputs
+
+
+def merge(outputs):
+    """One report row per (cohort, model) at its best number of components, and one timing row per cohort."""
+    rows, timings = [], []
+    for out in outputs:
+        timing = {key: out.get(key) for key in ["cohort", "rows", "load_seconds", "preprocess_seconds",
+                                                "evaluate_seconds", "pid", "attempts"]}
+        timing["status"] = "failed" if "error" in out else "ok"
+        timings.append(timing)
+        if "error" in out:
+            continue
+        summary = out["summary"]
+        best = summary.loc[summary.groupby("model")["mean_accuracy"].idxmax()]
+        best.insert(0, "cohort", out["cohort"])
+        rows.append(best)
+    report = pd.concat(rows, ignore_index=True) if rows else pd.DataFrame()
+    timings = pd.DataFrame(timings).sort_values("cohort").reset_index(drop=True)
+    timings["rows"] = timings["rows"].astype("Int64")
+    return report, timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cohorts", nargs="+", help="directories or glob patterns of cohort CSV files")
+    parser.add_argument("--workers", type=int, default=None, help="cohorts run at the same time (default: all cores)")
+    parser.add_argument("--memory-limit", type=float, default=None,
+                        help="memory budget in MB (default: 70%% of the available memory)")
+    parser.add_argument("--max-attempts", type=int, default=3,
+                        help="times a cohort may kill its worker before it is reported as failed")
+    parser.add_argument("--splits", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--max-components", type=int, default=24)
+    parser.add_argument("--boost", action="store_true")
+    parser.add_argument("--cache-dir", default=".ckd_cache/cv")
+    parser.add_argument("--seed", type=int, default=12)
+    parser.add_argument("--out", default="batch_report.csv")
+    parser.add_argument("--timings", default="batch_timings.csv")
+    args = parser.parse_args(argv)
+
+    paths = find_cohorts(args.cohorts)
+    if not paths:
+        parser.error("no cohort files found")
+    options = {"splits": args.splits, "repeats": args.repeats, "max_components": args.max_components,
+               "boost": args.boost, "cache_dir": args.cache_dir, "seed": args.seed}
+    memory_limit = None if args.memory_limit is None else args.memory_limit * 2**20
+
+    start = time.perf_counter()
+    outputs = run_batch(paths, options, args.workers, memory_limit, args.max_attempts)
+    report, timings = merge(outputs)
+    report.to_csv(args.out, index=False)
+    timings.to_csv(args.timings, index=False)
+
+    print("\n" + timings.to_string(index=False, float_format="%.2f"))
+    print("\n{} cohorts ({} failed) in {:.1f}s; report written to {}, timings to {}".format(
+        len(timings), int((timings["status"] == "failed").sum()), time.perf_counter() - start,
+        args.out, args.timings))
+
+
+if __name__ == "__main__":
+    main()
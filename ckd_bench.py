@@ -0,0 +1,371 @@
+"""Benchmarks of every stage of the pipeline, over synthetic datasets of growing size.
+
+One benchmark per stage: typo cleaning, replace/astype conversion, each of the
+six transformers, KNN imputation, the PCA sweep, fit/predict of each model,
+AdaBoost and the neural networks. Each one runs on synthetic cohorts
+(ckd_synth) of 1k, 100k and 1M rows by default. Time is the best of a few
+repeats; peak memory is measured with tracemalloc in a separate run, so that
+tracing does not skew the timings.
+
+Results are appended to a JSON history file, and every run is compared with
+the previous results of the same benchmark and size, so that regressions and
+scaling curves are visible.
+
+Stages whose cost grows quadratically with the rows (the row-by-row typo loop,
+KNN imputation, SVMs, nearest neighbours) are capped by default and recorded
+as skipped above their cap; --no-limits lifts the caps.
+
+Usage:
+    python ckd_bench.py --source chronic_kidney_disease.csv --sizes 1000 100000 1000000
+    python ckd_bench.py --filter "Transformer|PCA" --sizes 1000 100000
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import re
+import subprocess
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+
+from sklearn.decomposition import PCA
+from sklearn.impute import KNNImputer
+from sklearn.impute import SimpleImputer
+from sklearn.preprocessing import RobustScaler
+
+import ckd_common
+import ckd_synth
+
+default_sizes = [1000, 100000, 1000000]
+
+#Regressions above this ratio (new time / previous time) are flagged
+regression_ratio = 1.2
+
+
+class Benchmark:
+
+    def __init__(self, name, func, setup, max_rows=None):
+        self.name = name
+        self.func = func
+        self.setup = setup
+        self.max_rows = max_rows
+
+
+benchmarks = []
+
+
+def benchmark(name, setup="clean", max_rows=None):
+    """Registers `func(data)` as a benchmark run on the output of the `setup` fixture."""
+    def register(func):
+        benchmarks.append(Benchmark(name, func, setup, max_rows))
+        return func
+    return register
+
+
+class Unavailable(Exception):
+    """Raised by a fixture or benchmark that cannot run in this environment."""
+
+
+#Fixtures: each one builds the input of a family of benchmarks for one dataset size
+
+class Fixtures:
+
+    def __init__(self, model, n_rows, seed, cache_dir):
+        self.model = model
+        self.n_rows = n_rows
+        self.seed = seed
+        self.cache_dir = cache_dir
+        self._cache = {}
+
+    def get(self, name):
+        if name not in self._cache:
+            self._cache[name] = getattr(self, "make_" + name)()
+        return self._cache[name]
+
+    def make_path(self):
+        """The synthetic cohort, written once per (size, seed) like the real file."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, "synthetic-{}-{}.csv".format(self.n_rows, self.seed))
+        if not os.path.exists(path):
+            ckd_synth.write_csv(self.model, path + ".tmp", self.n_rows, self.seed)
+            os.replace(path + ".tmp", path)
+        return path
+
+    def make_raw(self):
+        return ckd_common.load_data(self.get("path"))
+
+    def make_typo_fixed(self):
+        return ckd_common.fix_typos(self.get("raw").copy())
+
+    def make_clean(self):
+        return ckd_common.clean(self.get("raw").copy())
+
+    def make_numeric(self):
+        return self.get("clean")[ckd_common.numeric]
+
+    def make_scaled(self):
+        """Scaled complete features and target; median imputation stands in for KNN to keep setup cheap."""
+        data = self.get("clean")
+        data = data[data[ckd_common.target].notna()]
+        X = data.drop(columns=ckd_common.target).to_numpy()
+        X = SimpleImputer(strategy='median').fit_transform(X)
+        return RobustScaler(quantile_range=(15,85)).fit_transform(X), data[ckd_common.target].to_numpy()
+
+
+def script_typo_loop(data):
+    """The row-by-row typo correction of the script, verbatim."""
+    for i in range(data.shape[0]):
+        if data.iloc[i,24]=='ckd\t':
+            data.iloc[i,24]='ckd'
+        if data.iloc[i,19] in [' yes','\tyes']:
+            data.iloc[i,19]='yes'
+        if data.iloc[i,19]=='\tno':
+            data.iloc[i,19]='no'
+        if data.iloc[i,20]=='\tno':
+            data.iloc[i,20]='no'
+        if data.iloc[i,15]=='\t?':
+            data.iloc[i,15]=np.nan
+        if data.iloc[i,15]=='\t43':
+            data.iloc[i,15]='43'
+        if data.iloc[i,16]=='\t?':
+            data.iloc[i,16]=np.nan
+        if data.iloc[i,16]=='\t6200':
+            data.iloc[i,16]= '6200'
+        if data.iloc[i,16]=='\t8400':
+            data.iloc[i,16]= '6200'
+        if data.iloc[i,17]=='\t?':
+            data.iloc[i,17]=np.nan
+        if data.iloc[i,24]=='ckd':
+            data.iloc[i,24]='yes'
+        if data.iloc[i,24]=='notckd':
+            data.iloc[i,24]='no'
+    return data
+
+
+#The benchmarks
+
+@benchmark("Typo cleaning (script row loop)", setup="raw", max_rows=100000)
+def bench_typo_loop(raw):
+    script_typo_loop(raw.copy())
+
+
+@benchmark("Typo cleaning (vectorized)", setup="raw")
+def bench_typo_vectorized(raw):
+    ckd_common.fix_typos(raw.copy())
+
+
+@benchmark("Replace/astype conversion", setup="typo_fixed")
+def bench_encode(data):
+    ckd_common.encode(data)
+
+
+def _register_transformers():
+    for index, tr_name in enumerate(ckd_common.tr_names):
+        def bench(numeric, index=index):
+            ckd_common.make_transformers()[index].fit_transform(numeric)
+        benchmark("Transformer: " + tr_name, setup="numeric")(bench)
+
+
+_register_transformers()
+
+
+@benchmark("KNN imputation", max_rows=100000)
+def bench_knn_imputation(data):
+    KNNImputer(weights='distance', n_neighbors=8).fit_transform(data)
+
+
+@benchmark("PCA sweep (1-24 components)", setup="scaled")
+def bench_pca_sweep(scaled):
+    X, _ = scaled
+    for n_comps in range(1, min(24, X.shape[1]) + 1):
+        PCA(n_components=n_comps).fit_transform(X)
+
+
+#Nearest neighbours and kernel SVMs are quadratic in the number of rows
+_model_caps = {"SVM_RBF": 100000, "SVM_Poly2": 100000, "SVM_Poly3": 100000,
+               "Weighted 3NearestNeighbors": 100000, "Weighted 8NearestNeighbors": 100000,
+               "Weighted 15NearestNeighbors": 100000}
+
+#AdaBoost refits its base SVM fifty times
+_boost_caps = {"SVM_RBF": 5000, "SVM_Poly2": 5000, "SVM_Poly3": 5000}
+
+
+def _register_models():
+    for index, name in enumerate(ckd_common.names):
+        def bench(scaled, index=index):
+            X, y = scaled
+            model = ckd_common.make_models()[index]
+            model.fit(X, y)
+            model.predict(X)
+        benchmark("Fit/predict: " + name, setup="scaled", max_rows=_model_caps.get(name))(bench)
+
+    for index, name in enumerate(ckd_common.boost_names):
+        def bench(scaled, index=index):
+            X, y = scaled
+            booster = ckd_common.make_boost_models()[index]
+            booster.fit(X, y)
+            booster.score(X, y)
+        benchmark("AdaBoost: " + name, setup="scaled", max_rows=_boost_caps.get(name))(bench)
+
+
+_register_models()
+
+
+def _train_net(scaled, layers, epochs):
+    """Trains and applies a network shaped like the script's ones (relu layers, softmax output)."""
+    try:
+        from tensorflow.keras.layers import Dense
+        from tensorflow.keras.models import Sequential
+        from tensorflow.keras.callbacks import EarlyStopping
+        from tensorflow.keras.utils import to_categorical
+    except ImportError:
+        raise Unavailable("tensorflow is not installed")
+    X, y = scaled
+    net = Sequential()
+    net.add(Dense(layers[0], activation='relu', input_shape=(X.shape[1],)))
+    for units in layers[1:]:
+        net.add(Dense(units, activation='relu'))
+    net.add(Dense(2, activation='softmax'))
+    net.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+    net.fit(X, to_categorical(y), epochs=epochs, callbacks=[EarlyStopping(patience=5, monitor='accuracy')], verbose=0)
+    net.predict(X, verbose=0)
+
+
+@benchmark("NN training: little net", setup="scaled")
+def bench_little_net(scaled):
+    _train_net(scaled, [4], 50)
+
+
+@benchmark("NN training: big net", setup="scaled")
+def bench_big_net(scaled):
+    _train_net(scaled, [50, 30, 20, 10], 100)
+
+
+#Running and recording
+
+def measure(bench, data, repeat):
+    """(best time in seconds, peak traced memory in MB) of one benchmark."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        bench.func(data)
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        bench.func(data)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return min(times), peak / 2**20
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return json.load(f)
+
+
+def previous_results(history):
+    """Latest recorded seconds per (benchmark, rows)."""
+    latest = {}
+    for run in history:
+        for res in run["results"]:
+            if res.get("seconds") is not None:
+                latest[(res["benchmark"], res["rows"])] = res["seconds"]
+    return latest
+
+
+def run(sizes, pattern=None, repeat=3, seed=0, source="chronic_kidney_disease.csv",
+        cache_dir=".ckd_cache/bench", limits=True, verbose=True):
+    """Runs the selected benchmarks at every size; returns the list of results."""
+    selected = [b for b in benchmarks if pattern is None or re.search(pattern, b.name)]
+    model = ckd_synth.fit(source)
+    results = []
+    for n_rows in sizes:
+        fixtures = Fixtures(model, n_rows, seed, cache_dir)
+        for bench in selected:
+            res = {"benchmark": bench.name, "rows": n_rows, "seconds": None, "peak_mb": None}
+            if limits and bench.max_rows is not None and n_rows > bench.max_rows:
+                res["skipped"] = "above the {:,}-row cap".format(bench.max_rows)
+            else:
+                try:
+                    data = fixtures.get(bench.setup)
+                    with warnings.catch_warnings():
+                        warnings.simplefilter("ignore")
+                        res["seconds"], res["peak_mb"] = measure(bench, data, repeat)
+                except Unavailable as exc:
+                    res["skipped"] = str(exc)
+            results.append(res)
+            if verbose:
+                print(format_result(res))
+    return results
+
+
+def format_result(res, previous=None):
+    if res["seconds"] is None:
+        timing = "skipped ({})".format(res.get("skipped"))
+    else:
+        timing = "{:10.4f}s  {:10.1f} MB".format(res["seconds"], res["peak_mb"])
+        if previous:
+            ratio = res["seconds"] / previous
+            timing += "  x{:.2f} vs previous{}".format(ratio, "  <-- REGRESSION" if ratio > regression_ratio else "")
+    return "{:<45} {:>9,} rows  {}".format(res["benchmark"], res["rows"], timing)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default="chronic_kidney_disease.csv", help="real file the cohorts are modelled on")
+    parser.add_argument("--sizes", type=int, nargs="+", default=default_sizes)
+    parser.add_argument("--filter", help="regular expression on the benchmark names")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", default="bench_history.json")
+    parser.add_argument("--cache-dir", default=".ckd_cache/bench")
+    parser.add_argument("--no-limits", action="store_true", help="run the quadratic stages at every size")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for bench in benchmarks:
+            print(bench.name)
+        return
+
+    history = load_history(args.history)
+    previous = previous_results(history)
+    results = run(args.sizes, args.filter, args.repeat, args.seed, args.source, args.cache_dir,
+                  limits=not args.no_limits, verbose=False)
+
+    for res in results:
+        print(format_result(res, previous.get((res["benchmark"], res["rows"]))))
+
+    history.append({"date": datetime.datetime.now().isoformat(timespec="seconds"),
+                    "revision": git_revision(),
+                    "machine": platform.node(),
+                    "python": platform.python_version(),
+                    "repeat": args.repeat,
+                    "seed": args.seed,
+                    "results": results})
+    with open(args.history, "w") as f:
+        json.dump(history, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Shared pieces of the chronic kidney disease pipeline.
+
+The analysis in chronic_kidney_disease.py is a linear notebook script, so the
+feature lists, cleaning steps, transformers and models it uses are collected
+here for the tools that need to rerun parts of it (cross-validation, model
+selection, benchmarks, batch runs...).
+"""
+
+import hashlib
+import inspect
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from sklearn.preprocessing import QuantileTransformer
+from sklearn.preprocessing import PowerTransformer
+from sklearn.preprocessing import StandardScaler
+from sklearn.preprocessing import RobustScaler
+from sklearn.svm import SVC
+from sklearn.neighbors import KNeighborsClassifier
+from sklearn.naive_bayes import GaussianNB
+from sklearn.linear_model import LogisticRegression
+from sklearn.tree import DecisionTreeClassifier
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import AdaBoostClassifier
+from sklearn.neural_network import MLPClassifier
+
+feature_names=['Age (yrs)','Blood Pressure (mm/Hg)','Specific Gravity','Albumin','Sugar','Red Blood Cells',
+               'Pus Cells','Pus Cell Clumps','Bacteria','Blood Glucose Random (mgs/dL)','Blood Urea (mgs/dL)',
+               'Serum Creatinine (mgs/dL)','Sodium (mEq/L)','Potassium (mEq/L)','Hemoglobin (gms)','Packed Cell Volume',
+               'White Blood Cells (cells/cmm)','Red Blood Cells (millions/cmm)','Hypertension','Diabetes Mellitus',
+               'Coronary Artery Disease','Appetite','Pedal Edema','Anemia','Chronic Kidney Disease']
+
+target = 'Chronic Kidney Disease'
+
+numeric = ['Age (yrs)','Specific Gravity','Albumin','Sugar', 'Blood Pressure (mm/Hg)', 'Blood Glucose Random (mgs/dL)', 'Blood Urea (mgs/dL)', 'Serum Creatinine (mgs/dL)', 'Sodium (mEq/L)', 'Potassium (mEq/L)', 'Hemoglobin (gms)', 'Packed Cell Volume', 'White Blood Cells (cells/cmm)', 'Red Blood Cells (millions/cmm)']
+
+categoricals = [col for col in feature_names if col not in numeric and col != target]
+
+#Column order used from the transformations onwards: numerical, categorical, target
+ordered_columns = numeric + categoricals + [target]
+
+#Per-column typo corrections, same as the row loop in the script
+typo_fixes = {
+    24: {'ckd\t': 'yes', 'ckd': 'yes', 'notckd': 'no'},
+    19: {' yes': 'yes', '\tyes': 'yes', '\tno': 'no'},
+    20: {'\tno': 'no'},
+    15: {'\t?': np.nan, '\t43': '43'},
+    16: {'\t?': np.nan, '\t6200': '6200', '\t8400': '6200'},
+    17: {'\t?': np.nan},
+}
+
+#Encoding of the categorical tokens (ordinal features are left as numbers)
+encodings = {'normal': 1, 'abnormal': 0,
+             'present': 1, 'notpresent': 0,
+             'yes': 1, '\tyes': 1, ' yes': 1, '\tno': 0, 'no': 0,
+             'good': 1, 'poor': 0,
+             'ckd': 1, 'ckd\t': 1, 'notckd': 0,
+             '\t?': np.nan, '?': np.nan}
+
+tr_names = ['Normal Quantile Transformer', 'Uniform Quantile Transformer', 'Power Transformer', 'Robust Scaler', 'Wide Robust Scaler', 'Standard Scaler']
+
+names=["SVM_RBF","SVM_Poly2","SVM_Poly3","Weighted 3NearestNeighbors","Weighted 8NearestNeighbors",
+       "Weighted 15NearestNeighbors","Naive Bayes","Logistic Regression","Decision Tree","Random Forest"]
+
+boost_names = ["SVM_RBF","SVM_Poly2","SVM_Poly3","Naive Bayes","Logistic Regression","Decision Tree","Random Forest"]
+
+net_names = ["Little Neural Network", "Big(ger) Neural Network"]
+
+
+def load_data(path="chronic_kidney_disease.csv"):
+    """Reads a raw CKD file the same way the script does."""
+    return pd.read_csv(path, names=feature_names)
+
+
+def fix_typos(data):
+    """Corrects the typo tokens column by column (in place) and returns the frame."""
+    for index, fixes in typo_fixes.items():
+        col = feature_names[index]
+        data[col] = data[col].replace(fixes)
+    return data
+
+
+def encode(data):
+    """Encodes categorical tokens, marks missing values and casts everything to float."""
+    data = data.replace(encodings)
+    for col in data.columns:
+        data[col] = data[col].astype('float')
+    return data
+
+
+def clean(data):
+    """Full cleaning step: typos, encoding and column ordering."""
+    return encode(fix_typos(data))[ordered_columns]
+
+
+def make_transformers():
+    """Fresh instances of the six transformers compared in the script."""
+    return [QuantileTransformer(output_distribution='normal'),
+            QuantileTransformer(output_distribution='uniform'),
+            PowerTransformer(),
+            RobustScaler(),
+            RobustScaler(quantile_range=(15,85)),
+            StandardScaler()]
+
+
+def make_models():
+    """Fresh instances of the ten models evaluated over the PCA sweep."""
+    return [SVC(),
+            SVC(kernel='poly',degree=2),
+            SVC(kernel='poly',degree=3),
+            KNeighborsClassifier(n_neighbors=3,weights='distance'),
+            KNeighborsClassifier(n_neighbors=8,weights='distance'),
+            KNeighborsClassifier(n_neighbors=15,weights='distance'),
+            GaussianNB(),
+            LogisticRegression(),
+            DecisionTreeClassifier(),
+            RandomForestClassifier()]
+
+
+def make_booster(estimator):
+    """AdaBoost with the SAMME algorithm around `estimator`, for old and new sklearn alike."""
+    params = AdaBoostClassifier().get_params()
+    kwargs = {'algorithm': 'SAMME'} if 'algorithm' in params else {}
+    if 'estimator' in params:
+        kwargs['estimator'] = estimator
+    else:
+        kwargs['base_estimator'] = estimator
+    return AdaBoostClassifier(**kwargs)
+
+
+def make_boost_models():
+    """The seven boosted variants of the script."""
+    return [make_booster(mod) for mod in [SVC(),
+                                          SVC(degree=2, kernel='poly'),
+                                          SVC(kernel='poly'),
+                                          GaussianNB(),
+                                          LogisticRegression(),
+                                          DecisionTreeClassifier(),
+                                          RandomForestClassifier()]]
+
+
+def make_nets():
+    """sklearn counterparts of the two Keras networks (same layers, epochs and patience)."""
+    return [MLPClassifier(hidden_layer_sizes=(4,), max_iter=50, n_iter_no_change=5),
+            MLPClassifier(hidden_layer_sizes=(50,30,20,10), max_iter=100, n_iter_no_change=5)]
+
+
+def digest(*parts):
+    """Short, stable hash of arrays, frames and plain values (used as cache keys)."""
+    h = hashlib.sha1()
+    for part in parts:
+        if isinstance(part, pd.DataFrame):
+            h.update(repr(list(part.columns)).encode())
+            part = part.to_numpy()
+        if isinstance(part, np.ndarray):
+            if part.dtype == object:
+                part = part.astype(str)
+            part = np.ascontiguousarray(part)
+            h.update(repr((part.dtype.str, part.shape)).encode())
+            h.update(part.tobytes())
+        else:
+            h.update(repr(part).encode())
+        h.update(b'\0')
+    return h.hexdigest()[:16]
+
+
+def _is_project_module(module):
+    path = getattr(module, "__file__", None)
+    return path is not None and os.path.dirname(os.path.abspath(path)) == os.path.dirname(os.path.abspath(__file__))
+
+
+def _code_names(code):
+    """Global and attribute names read by a code object and the functions nested in it."""
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= _code_names(const)
+    return names
+
+
+def code_digest(*objects):
+    """Hash of the code of functions (or modules) and of everything of this project they use.
+
+    The module-level names a function reads, directly (`numeric`) or through a module of the project
+    (`ckd_common.typo_fixes`), are followed: functions recursively, data by value. So editing a
+    helper or a constant such as a typo table changes the hash of every function relying on it.
+    """
+    parts = {}
+
+    def visit(obj):
+        if not inspect.isfunction(obj):
+            parts[getattr(obj, "__name__", repr(obj))] = inspect.getsource(obj)
+            return
+        key = "{}.{}".format(obj.__module__, obj.__qualname__)
+        if key in parts:
+            return
+        parts[key] = inspect.getsource(obj)
+        names = _code_names(obj.__code__)
+        used = {"{}.{}".format(obj.__module__, name): obj.__globals__[name]
+                for name in names if name in obj.__globals__}
+        #Attributes read from modules of the project (e.g. ckd_common.typo_fixes)
+        for module in [value for value in list(used.values()) if inspect.ismodule(value)]:
+            if _is_project_module(module):
+                used.update({"{}.{}".format(module.__name__, name): getattr(module, name)
+                             for name in names if hasattr(module, name)})
+        for name, value in sorted(used.items()):
+            if inspect.ismodule(value) or inspect.isclass(value):
+                continue
+            if inspect.isfunction(value):
+                if _is_project_module(sys.modules.get(value.__module__)):
+                    visit(value)
+            elif not callable(value):
+                parts[name] = digest(value)
+
+    for obj in objects:
+        visit(obj)
+    return digest(*sorted(parts.items()))
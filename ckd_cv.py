@@ -0,0 +1,198 @@
+"""Repeated k-fold cross-validation of the model x PCA grid.
+
+The script compares every model on a single 80/20 split, and the LDA sweep even
+fits its pipeline on the testing set. Here every fold gets its own imputation,
+wide robust scaling and PCA basis, all fitted on the training part only.
+
+Each fold's preprocessing is done once and cached on disk (keyed by the data,
+the fold indices and the settings), then reused by every model and every
+number of PCA components: a PCA fitted with all components projects onto the
+same leading axes as a smaller one, so the projection for n components is just
+the first n columns. Folds are evaluated in parallel.
+
+Usage:
+    python ckd_cv.py --data chronic_kidney_disease.csv --splits 5 --repeats 3 --jobs -1
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from sklearn.base import clone
+from sklearn.decomposition import PCA
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+from sklearn.impute import KNNImputer
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import RepeatedStratifiedKFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import RobustScaler
+from sklearn.svm import SVC
+
+import ckd_common
+
+#Bump when the per-fold preprocessing changes, so that old cache files are ignored
+PREPROCESSING_VERSION = 1
+
+
+def default_candidates(boost=False):
+    """(name, estimator) pairs evaluated on top of the PCA projection."""
+    candidates = [("LDA + Linear SVC", make_pipeline(LinearDiscriminantAnalysis(), SVC(kernel='linear')))]
+    candidates += list(zip(ckd_common.names, ckd_common.make_models()))
+    if boost:
+        candidates += [("AdaBoost " + name, mod) for name, mod in zip(ckd_common.boost_names,
+                                                                      ckd_common.make_boost_models())]
+    return candidates
+
+
+def make_folds(y, n_splits=5, n_repeats=3, random_state=12):
+    """List of (train, test) index arrays, stratified on the target."""
+    cv = RepeatedStratifiedKFold(n_splits=n_splits, n_repeats=n_repeats, random_state=random_state)
+    return list(cv.split(np.zeros(len(y)), y))
+
+
+def preprocess_fold(X, train, test, max_components, cache_dir=None, fold_id=0):
+    """Imputes, scales and projects one fold, fitting everything on its training rows.
+
+    Returns (Z_train, Z_test, seconds, cache_hit). Z_* hold all `max_components`
+    principal components, in decreasing order of explained variance.
+    """
+    start = time.perf_counter()
+    path = None
+    if cache_dir is not None:
+        key = ckd_common.digest(X, train, test, max_components, PREPROCESSING_VERSION)
+        path = os.path.join(cache_dir, "fold{:03d}-{}.npz".format(fold_id, key))
+        if os.path.exists(path):
+            with np.load(path) as cached:
+                Z_train, Z_test = cached["train"], cached["test"]
+            return Z_train, Z_test, time.perf_counter() - start, True
+
+    imputer = KNNImputer(weights='distance', n_neighbors=8)
+    scaler = RobustScaler(quantile_range=(15,85))
+    pca = PCA(n_components=max_components, svd_solver='full')
+    pipe = make_pipeline(imputer, scaler, pca)
+
+    Z_train = pipe.fit_transform(X[train])
+    Z_test = pipe.transform(X[test])
+
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        #Write then rename, so that concurrent runs never read a partial file
+        tmp = path + ".{}.tmp.npz".format(os.getpid())
+        np.savez(tmp, train=Z_train, test=Z_test)
+        os.replace(tmp, path)
+    return Z_train, Z_test, time.perf_counter() - start, False
+
+
+def evaluate_fold(fold_id, X, y, train, test, candidates, components, max_components, cache_dir=None):
+    """Scores every candidate at every number of components on one fold."""
+    Z_train, Z_test, prep_seconds, hit = preprocess_fold(X, train, test, max_components, cache_dir, fold_id)
+    y_train, y_test = y[train], y[test]
+
+    records = []
+    for name, estimator in candidates:
+        for n_comps in components:
+            model = clone(estimator)
+            start = time.perf_counter()
+            model.fit(Z_train[:, :n_comps], y_train)
+            fit_seconds = time.perf_counter() - start
+            y_pred = model.predict(Z_test[:, :n_comps])
+            records.append({"fold": fold_id,
+                            "model": name,
+                            "n_components": n_comps,
+                            "accuracy": accuracy_score(y_pred, y_test),
+                            "fit_seconds": fit_seconds,
+                            "predict_seconds": time.perf_counter() - start - fit_seconds})
+    fold_info = {"fold": fold_id, "preprocess_seconds": prep_seconds, "cache_hit": hit}
+    return records, fold_info
+
+
+def cross_validate(X, y, candidates=None, components=None, n_splits=5, n_repeats=3,
+                   n_jobs=-1, cache_dir=".ckd_cache/cv", random_state=12):
+    """Runs the whole grid over repeated stratified k-fold.
+
+    Returns (results, folds): one row per (fold, model, n_components), and one
+    row per fold with its preprocessing time and whether it came from the cache.
+    """
+    if candidates is None:
+        candidates = default_candidates()
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y)
+    folds = make_folds(y, n_splits, n_repeats, random_state)
+    max_components = min(X.shape[1], min(len(train) for train, _ in folds))
+    if components is None:
+        components = range(1, max_components + 1)
+    components = [n for n in components if n <= max_components]
+
+    out = Parallel(n_jobs=n_jobs)(
+        delayed(evaluate_fold)(fold_id, X, y, train, test, candidates, components, max_components, cache_dir)
+        for fold_id, (train, test) in enumerate(folds))
+
+    results = pd.DataFrame([rec for records, _ in out for rec in records])
+    fold_info = pd.DataFrame([info for _, info in out])
+    return results, fold_info
+
+
+def summarize(results):
+    """Mean/std accuracy and mean timings per (model, n_components), best first."""
+    summary = results.groupby(["model", "n_components"]).agg(
+        mean_accuracy=("accuracy", "mean"),
+        std_accuracy=("accuracy", "std"),
+        fit_seconds=("fit_seconds", "mean"),
+        predict_seconds=("predict_seconds", "mean"))
+    return summary.sort_values("mean_accuracy", ascending=False).reset_index()
+
+
+def load_xy(path):
+    """Cleaned features and target of a raw CKD file (rows without target dropped)."""
+    data = ckd_common.clean(ckd_common.load_data(path))
+    data = data[data[ckd_common.target].notna()]
+    return data.drop(columns=ckd_common.target).to_numpy(), data[ckd_common.target].to_numpy()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="chronic_kidney_disease.csv")
+    parser.add_argument("--splits", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=-1, help="parallel folds (-1: all cores)")
+    parser.add_argument("--max-components", type=int, default=24)
+    parser.add_argument("--boost", action="store_true", help="also evaluate the AdaBoost variants")
+    parser.add_argument("--cache-dir", default=".ckd_cache/cv")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--seed", type=int, default=12)
+    parser.add_argument("--out", help="CSV file for the per-fold results")
+    args = parser.parse_args(argv)
+
+    X, y = load_xy(args.data)
+
+    start = time.perf_counter()
+    results, fold_info = cross_validate(X, y,
+                                        candidates=default_candidates(args.boost),
+                                        components=range(1, args.max_components + 1),
+                                        n_splits=args.splits,
+                                        n_repeats=args.repeats,
+                                        n_jobs=args.jobs,
+                                        cache_dir=None if args.no_cache else args.cache_dir,
+                                        random_state=args.seed)
+    elapsed = time.perf_counter() - start
+
+    if args.out:
+        results.to_csv(args.out, index=False)
+
+    summary = summarize(results)
+    with pd.option_context("display.max_rows", 40, "display.width", 120):
+        print(summary.head(40).to_string(index=False, float_format="%.4f"))
+    print("\nBest configuration per model:")
+    best = summary.loc[summary.groupby("model")["mean_accuracy"].idxmax()]
+    print(best.sort_values("mean_accuracy", ascending=False).to_string(index=False, float_format="%.4f"))
+    print("\n{} folds, {} fits in {:.2f}s (preprocessing: {:.2f}s, {} of {} folds from cache)".format(
+        len(fold_info), len(results), elapsed, fold_info["preprocess_seconds"].sum(),
+        int(fold_info["cache_hit"].sum()), len(fold_info)))
+
+
+if __name__ == "__main__":
+    main()
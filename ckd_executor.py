@@ -0,0 +1,527 @@
+"""Pluggable execution backends for the independent tasks of the analysis.
+
+The transformer fits, the imputations, the model grid, the boosting loop and
+the network sweep are lists of independent tasks. They all go through an
+executor chosen on the command line (--executor):
+
+    serial     one after the other in the calling thread (for debugging)
+    threads    a thread pool
+    processes  a process pool
+    socket     worker processes connected to a coordinator over TCP. The
+               coordinator starts --workers local ones; workers on other
+               machines can join a coordinator listening on a reachable
+               --executor-address, with the key set in CKD_EXECUTOR_AUTHKEY
+               on both sides:
+                   CKD_EXECUTOR_AUTHKEY=<key> python ckd_executor.py HOST:PORT
+
+Whatever the backend:
+
+- results come back in the order of the tasks, and `imap` hands them out as
+  they are ready, with at most one task per worker in flight, so that large
+  outputs can be written out one at a time;
+- with `seed=`, every task gets a seed derived from the base seed and its
+  position only, so a run gives the same results on every backend and
+  number of workers (estimators passed to the tasks below get it as their
+  random_state, when it is not set). Tasks seeding global random state
+  (e.g. Keras through set_random_seed) must be marked `@uses_global_rng`: the
+  thread backend then runs them one at a time;
+- every task is timed where it runs (wall and CPU time, worker), available
+  from `executor.timings()` and as spans of the profiler's trace.
+
+    executor = ckd_executor.from_args(args)
+    scores = executor.map(ckd_executor.fit_score, [(model, X_train, Y_train, X_test, Y_test) for model in models],
+                          seed=12, name="Model grid iteration")
+
+Except with the serial and thread backends, task functions and arguments are
+pickled: the functions have to be importable from a module (not defined in
+the script itself).
+"""
+
+import argparse
+import collections
+import contextlib
+import itertools
+import multiprocessing
+import numbers
+import os
+import pickle
+import queue
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener, wait
+
+import numpy as np
+import pandas as pd
+
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+
+import ckd_profiling
+
+backends = ["serial", "threads", "processes", "socket"]
+
+#Environment variable holding the key workers authenticate with
+authkey_env = "CKD_EXECUTOR_AUTHKEY"
+
+
+class TaskError(RuntimeError):
+    """A task raised; the message holds the traceback from where it ran."""
+
+
+def task_seed(seed, index):
+    """Seed of the `index`-th task of a map with base seed `seed`."""
+    return int(np.random.SeedSequence([seed, index]).generate_state(1)[0])
+
+
+#Held by the tasks using global random state that run in threads
+_global_rng_lock = threading.Lock()
+
+
+def uses_global_rng(func):
+    """Marks a task function that seeds or draws from global random state (Python, NumPy, TensorFlow).
+
+    In a thread pool, such tasks run one at a time, each after seeding the global generators, so
+    that they stay reproducible; other backends run every task alone in its process anyway.
+    """
+    func.uses_global_rng = True
+    return func
+
+
+def _run(func, args, seed, isolated):
+    """Runs one task where the backend placed it; returns (ok, value or traceback, timing).
+
+    `isolated` tells that nothing else runs in the process meanwhile, so that the global random
+    generators can be seeded and the process CPU time is the task's.
+    """
+    worker = "{}:{}".format(socket.gethostname(), os.getpid())
+    if not isolated:
+        worker += "/" + threading.current_thread().name
+    exclusive = not isolated and getattr(func, "uses_global_rng", False)
+    with _global_rng_lock if exclusive else contextlib.nullcontext():
+        kwargs = {}
+        if seed is not None:
+            kwargs["seed"] = seed
+            if isolated or exclusive:
+                random.seed(seed)
+                np.random.seed(seed)
+        clock = time.process_time if isolated else time.thread_time
+        started, cpu, start = time.time(), clock(), time.perf_counter()
+        try:
+            value, ok = func(*args, **kwargs), True
+        except Exception:
+            value, ok = traceback.format_exc(), False
+        timing = {"worker": worker, "started": started, "seconds": time.perf_counter() - start,
+                  "cpu": clock() - cpu}
+    return ok, value, timing
+
+
+def _no_delay(conn):
+    """Disables Nagle's algorithm on a connection: tasks and results are small, latency-bound messages."""
+    sock = socket.fromfd(conn.fileno(), socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    sock.close()
+    return conn
+
+
+class Executor:
+    """Runs independent tasks; subclasses implement `_submit` and `_result`."""
+
+    name = None
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count()
+        self._timings = []
+
+    def _submit(self, func, args, seed):
+        """Starts (or schedules) a task; returns a handle for `_result`."""
+        raise NotImplementedError
+
+    def _result(self, handle):
+        """(ok, value or traceback, timing) of a submitted task, once it is done."""
+        raise NotImplementedError
+
+    def _window(self):
+        """How many tasks may be submitted and not consumed yet."""
+        return max(self.workers, 1)
+
+    def _record(self, name, index, seed, tags, rows, timing):
+        timing.update({"name": name, "index": index, "seed": seed, "rows": rows, "backend": self.name}, **tags)
+        self._timings.append(timing)
+        ckd_profiling.task(name, timing["started"], timing["seconds"], timing["cpu"], timing["worker"],
+                           rows=rows, index=index, **tags)
+
+    def imap(self, func, tasks, seed=None, name="Task", tags=None, rows=None):
+        """Iterator over func(*args) for args in tasks, in the order of the tasks.
+
+        Every call is also given `seed=` unless `seed` is None. `tasks` is an iterable of tuples of
+        positional arguments, consumed lazily like `tags` (one dict per task, labelling the timings)
+        and `rows` (the rows each task processes for the profiler, or one count for all of them):
+        at most `_window()` tasks are in flight or waiting to be consumed at a time. Raises TaskError
+        at the first task that failed, once the tasks in flight are done.
+        """
+        tasks = iter(tasks)
+        tags = iter(tags) if tags is not None else None
+        rows = itertools.repeat(rows) if rows is None or isinstance(rows, numbers.Integral) else iter(rows)
+        counter = itertools.count()
+        window = collections.deque()
+
+        def fill():
+            while len(window) < self._window():
+                try:
+                    args = next(tasks)
+                except StopIteration:
+                    return
+                index = next(counter)
+                seed_i = None if seed is None else task_seed(seed, index)
+                window.append((index, seed_i, next(tags) if tags is not None else {}, next(rows),
+                               self._submit(func, tuple(args), seed_i)))
+
+        def collect(entry):
+            index, seed_i, task_tags, task_rows, handle = entry
+            ok, value, timing = self._result(handle)
+            self._record(name, index, seed_i, task_tags, task_rows, timing)
+            if not ok:
+                return ok, "{} #{} failed on {}:\n{}".format(name, index, timing["worker"], value)
+            return ok, value
+
+        try:
+            fill()
+            while window:
+                ok, value = collect(window.popleft())
+                if not ok:
+                    failures = [value] + [other for ok, other in map(collect, window) if not ok]
+                    window.clear()
+                    raise TaskError("\n".join(failures))
+                fill()
+                yield value
+        finally:
+            #Also when the caller stops early: no task is left running, nor any result on a worker
+            while window:
+                collect(window.popleft())
+
+    def map(self, func, tasks, seed=None, name="Task", tags=None, rows=None):
+        """list(imap(...)): the results of every task, in the order of the tasks."""
+        return list(self.imap(func, tasks, seed, name, tags, rows))
+
+    def timings(self):
+        """One row per task run so far: name, index, seed, worker, start time, wall and CPU seconds."""
+        return pd.DataFrame(self._timings)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+
+class SerialExecutor(Executor):
+    name = "serial"
+
+    def __init__(self, workers=None):
+        super().__init__(1)
+
+    def _submit(self, func, args, seed):
+        #Run when the result is asked for, so that only one output exists at a time
+        return func, args, seed
+
+    def _result(self, handle):
+        return _run(*handle, True)
+
+
+class ThreadExecutor(Executor):
+    name = "threads"
+
+    def __init__(self, workers=None):
+        super().__init__(workers)
+        self._pool = ThreadPoolExecutor(self.workers, thread_name_prefix="ckd")
+
+    def _submit(self, func, args, seed):
+        return self._pool.submit(_run, func, args, seed, False)
+
+    def _result(self, handle):
+        return handle.result()
+
+    def close(self):
+        self._pool.shutdown()
+
+
+class ProcessExecutor(Executor):
+    """A pool of forked processes.
+
+    The script has no `if __name__ == "__main__"` guard: with the spawn or forkserver start methods
+    (the defaults on macOS and Windows, and from Python 3.14 on Linux), every worker would import it
+    again and rerun the analysis. Workers are therefore always forked; where fork is not available
+    (Windows), use the socket executor, whose workers do not import the script.
+    """
+
+    name = "processes"
+
+    def __init__(self, workers=None):
+        super().__init__(workers)
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("the processes executor needs the fork start method, which this platform "
+                               "does not have; use --executor socket instead")
+        self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("fork"))
+
+    def _submit(self, func, args, seed):
+        return self._pool.submit(_run, func, args, seed, True)
+
+    def _result(self, handle):
+        return handle.result()
+
+    def close(self):
+        self._pool.shutdown()
+
+
+class SocketExecutor(Executor):
+    """A coordinator handing tasks to the worker processes connected to it, one task at a time.
+
+    `workers` local workers are started (0 to only use workers started by hand), and started again
+    if they die; a worker that disconnects has its task handed to another one, up to
+    `max_attempts` times, after which the task fails. The key is never printed: workers started by
+    hand need it set in CKD_EXECUTOR_AUTHKEY on both sides.
+    """
+
+    name = "socket"
+    #Workers a task may lose before it is reported as failed
+    max_attempts = 3
+
+    def __init__(self, workers=None, address=("127.0.0.1", 0), authkey=None):
+        super().__init__(workers)
+        if workers == 0:
+            self.workers = 0
+        if authkey is None:
+            authkey = os.environ.get(authkey_env)
+        if not authkey:
+            if self.workers == 0:
+                raise ValueError("workers started by hand need the key; set ${} for the coordinator "
+                                 "and its workers".format(authkey_env))
+            authkey = secrets.token_hex(16)
+        self.authkey = authkey.encode() if isinstance(authkey, str) else authkey
+        self._listener = Listener(address, authkey=self.authkey)
+        self.address = self._listener.address
+        self._closed = False
+        self._joined = queue.Queue()
+        self._idle = []
+        #Tasks waiting for a worker, tasks running (by connection) and results not collected yet
+        self._pending = collections.deque()
+        self._busy = {}
+        self._outcomes = {}
+        #Workers lost by each task, and local workers to start again once they are seen dead
+        self._losses = collections.Counter()
+        self._lost_workers = 0
+        self._ids = itertools.count()
+        self._announced = False
+        threading.Thread(target=self._accept, daemon=True).start()
+
+        self._env = dict(os.environ, **{authkey_env: self.authkey.decode()})
+        self._command = [sys.executable, os.path.abspath(__file__), "{}:{}".format(*self.address)]
+        self._processes = [subprocess.Popen(self._command, env=self._env) for _ in range(self.workers)]
+
+    def _restart_dead_workers(self):
+        for i, process in enumerate(self._processes):
+            if self._lost_workers and process.poll() is not None:
+                self._processes[i] = subprocess.Popen(self._command, env=self._env)
+                self._lost_workers -= 1
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                self._joined.put(_no_delay(self._listener.accept()))
+            except Exception:
+                #Refused authentication, or the listener was closed
+                continue
+
+    def _wait_for_worker(self, timeout=0.1):
+        try:
+            self._idle.append(self._joined.get(timeout=timeout))
+        except queue.Empty:
+            self._restart_dead_workers()
+            if self._processes and all(process.poll() is not None for process in self._processes):
+                raise RuntimeError("every local worker exited before connecting")
+
+    def _window(self):
+        return max(self.workers, len(self._idle) + len(self._busy) + self._joined.qsize(), 1)
+
+    def _dispatch(self):
+        while not self._joined.empty():
+            self._idle.append(self._joined.get())
+        while self._pending and self._idle:
+            conn = self._idle.pop()
+            task_id, message = self._pending.popleft()
+            try:
+                conn.send(message)
+                self._busy[conn] = (task_id, message, time.time())
+            except (OSError, EOFError):
+                self._pending.appendleft((task_id, message))
+
+    def _pump(self):
+        """Hands out pending tasks and collects the results that are ready."""
+        self._dispatch()
+        if not self._busy:
+            if not self._processes and not self._announced:
+                print("Waiting for workers: python {} {}:{} (with the coordinator's ${} set)".format(
+                    os.path.basename(__file__), *self.address, authkey_env), flush=True)
+                self._announced = True
+            self._wait_for_worker()
+            return
+        for conn in wait(list(self._busy), timeout=0.1):
+            task_id, message, started = self._busy.pop(conn)
+            try:
+                self._outcomes[task_id] = conn.recv()
+                self._idle.append(conn)
+                continue
+            except (OSError, EOFError):
+                pass
+            #The worker went away: its task goes to another one, unless it keeps taking workers down
+            self._losses[task_id] += 1
+            if self._losses[task_id] >= self.max_attempts:
+                timing = {"worker": "socket worker", "started": started, "seconds": time.time() - started,
+                          "cpu": float("nan")}
+                self._outcomes[task_id] = (False, "its worker disconnected (crashed?) on each of its {} "
+                                                  "attempts".format(self._losses[task_id]), timing)
+            else:
+                self._pending.appendleft((task_id, message))
+            if self._processes:
+                self._lost_workers += 1
+            self._restart_dead_workers()
+
+    def _submit(self, func, args, seed):
+        task_id = next(self._ids)
+        self._pending.append((task_id, (func, args, seed)))
+        self._dispatch()
+        return task_id
+
+    def _result(self, handle):
+        while handle not in self._outcomes:
+            self._pump()
+        self._losses.pop(handle, None)
+        return self._outcomes.pop(handle)
+
+    def close(self):
+        self._closed = True
+        self._listener.close()
+        #Workers that connected but never got a task are told to stop too
+        while not self._joined.empty():
+            self._idle.append(self._joined.get())
+        for conn in self._idle:
+            try:
+                conn.send(None)
+                conn.close()
+            except OSError:
+                pass
+        for process in self._processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.terminate()
+
+
+def serve(address, authkey):
+    """Worker loop: runs the tasks sent by the coordinator at `address` until told to stop."""
+    try:
+        conn = _no_delay(Client(address, authkey=authkey))
+    except (ConnectionError, EOFError):
+        #The coordinator closed before accepting this worker
+        return
+    with conn:
+        while True:
+            try:
+                message = conn.recv_bytes()
+            except EOFError:
+                break
+            try:
+                message = pickle.loads(message)
+            except Exception:
+                #The task could not even be unpickled (e.g. its module is missing here)
+                conn.send((False, traceback.format_exc(), {"worker": "{}:{}".format(socket.gethostname(), os.getpid()),
+                                                           "started": time.time(), "seconds": 0.0, "cpu": 0.0}))
+                continue
+            if message is None:
+                break
+            func, args, seed = message
+            outcome = _run(func, args, seed, True)
+            try:
+                conn.send(outcome)
+            except (pickle.PicklingError, TypeError, AttributeError):
+                conn.send((False, traceback.format_exc(), outcome[2]))
+
+
+def make_executor(backend="serial", workers=None, address=None):
+    """An executor of the given backend (`address`, "HOST:PORT", only matters for socket)."""
+    if backend == "serial":
+        return SerialExecutor()
+    if backend == "threads":
+        return ThreadExecutor(workers)
+    if backend == "processes":
+        return ProcessExecutor(workers)
+    if backend == "socket":
+        host, port = (address or "127.0.0.1:0").rsplit(":", 1)
+        return SocketExecutor(workers, (host, int(port)))
+    raise ValueError("unknown executor {!r} (expected one of {})".format(backend, ", ".join(backends)))
+
+
+def add_arguments(parser):
+    """Adds the executor command line switches to an argparse parser."""
+    parser.add_argument("--executor", choices=backends, default="serial",
+                        help="how independent tasks (fits, imputations, grids) are run")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="threads/processes/local socket workers (default: all cores)")
+    parser.add_argument("--executor-address", metavar="HOST:PORT", default=None,
+                        help="where the socket coordinator listens (default: a free local port)")
+    parser.add_argument("--seed", type=int, default=0, help="base seed of the tasks")
+
+
+def from_args(args):
+    return make_executor(args.executor, args.workers, args.executor_address)
+
+
+#Tasks for scikit-learn estimators
+
+def seeded(estimator, seed):
+    """A fresh clone of `estimator`, with every unset random_state (nested ones included) set to `seed`."""
+    estimator = clone(estimator)
+    if seed is not None:
+        params = estimator.get_params()
+        estimator.set_params(**{key: seed for key, value in params.items()
+                                if key.split("__")[-1] == "random_state" and value is None})
+    return estimator
+
+
+def fit_transform(estimator, X, seed=None):
+    """Output of a clone of `estimator` fitted on X."""
+    return seeded(estimator, seed).fit_transform(X)
+
+
+def fit_score(estimator, X_train, Y_train, X_test, Y_test, seed=None):
+    """(training accuracy, testing accuracy) of a clone of `estimator` fitted on the training data."""
+    estimator = seeded(estimator, seed)
+    estimator.fit(X_train, Y_train)
+    return (accuracy_score(estimator.predict(X_train), Y_train),
+            accuracy_score(estimator.predict(X_test), Y_test))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Worker of the socket executor")
+    parser.add_argument("address", metavar="HOST:PORT", help="address of the coordinator")
+    args = parser.parse_args(argv)
+    authkey = os.environ.get(authkey_env)
+    if not authkey:
+        parser.error("the coordinator's key must be given in ${}".format(authkey_env))
+    host, port = args.address.rsplit(":", 1)
+    serve((host, int(port)), authkey.encode())
+
+
+if __name__ == "__main__":
+    main()
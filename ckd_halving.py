@@ -0,0 +1,253 @@
+"""Successive-halving model selection over the model x PCA grid.
+
+Instead of fitting every (model, n_components) pair on all of the training
+data, every candidate is first cross-validated on a small budget. Only the best
+1/factor of them are promoted to the next rung, which gets factor times more
+budget, until the survivors are fitted with the full one.
+
+The budget is a share of each fold's training rows, except for the ensembles
+(Random Forest, AdaBoost), whose cost is mostly per member rather than per row:
+they are fitted on the full folds with a share of their n_estimators.
+Stochastic candidates are seeded, so that the same ones get promoted on every
+run.
+
+Folds and their preprocessing come from ckd_cv (and its on-disk cache). The
+row subsamples are nested: a candidate promoted to a bigger budget sees the
+rows it was scored on before, plus new ones.
+
+The summary reports the measured fit time, against the exhaustive grid's:
+measured with --compare, otherwise a lower estimate extrapolated from the
+measured fits.
+
+Usage:
+    python ckd_halving.py --data chronic_kidney_disease.csv --factor 3 --compare
+"""
+
+import argparse
+import math
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+
+import ckd_common
+import ckd_cv
+from ckd_executor import seeded
+
+
+def grid_candidates(components=range(1, 25), boost=True, nets=True, random_state=12):
+    """Every (name, estimator, n_components) triple of the exhaustive grid, stochastic estimators seeded."""
+    models = ckd_cv.default_candidates(boost)
+    if nets:
+        models += list(zip(ckd_common.net_names, ckd_common.make_nets()))
+    return [(name, seeded(estimator, random_state), n_comps) for name, estimator in models for n_comps in components]
+
+
+def budgets(min_resources, max_resources, factor):
+    """Training rows per fold at each rung, the last one being the full fold."""
+    n_rungs = max(1, int(math.ceil(math.log(max_resources / min_resources, factor))) + 1)
+    rungs = [min(max_resources, int(min_resources * factor ** i)) for i in range(n_rungs)]
+    rungs[-1] = max_resources
+    return rungs
+
+
+def budget_params(estimator, share):
+    """Parameters fitting `estimator` on a `share` of its budget, and whether rows are its budget.
+
+    Ensembles get a share of their members and every row; the other estimators keep their
+    parameters and get a share of the rows.
+    """
+    params = estimator.get_params()
+    if "n_estimators" in params:
+        return {"n_estimators": max(1, int(round(params["n_estimators"] * share)))}, False
+    return {}, True
+
+
+def _fit_score(estimator, params, n_comps, Z_train, y_train, Z_test, y_test):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        model = clone(estimator).set_params(**params)
+        start = time.perf_counter()
+        model.fit(Z_train[:, :n_comps], y_train)
+        accuracy = accuracy_score(model.predict(Z_test[:, :n_comps]), y_test)
+    return accuracy, time.perf_counter() - start
+
+
+def _subsample_orders(y, folds, random_state):
+    """A fixed permutation of each fold's training rows, interleaving both classes."""
+    rng = np.random.default_rng(random_state)
+    orders = []
+    for train, _ in folds:
+        y_train = y[train]
+        order = np.empty(len(train), dtype=int)
+        #Ranking each class separately then merging on the relative rank keeps
+        #every prefix of the permutation stratified
+        keys = np.empty(len(train))
+        for label in np.unique(y_train):
+            idx = np.flatnonzero(y_train == label)
+            keys[idx[rng.permutation(len(idx))]] = (np.arange(len(idx)) + rng.random()) / len(idx)
+        order[:] = np.argsort(keys, kind="stable")
+        orders.append(order)
+    return orders
+
+
+def evaluate_rung(candidates, alive, prepared, y, folds, orders, resources, max_resources, n_jobs):
+    """Cross-validated accuracy of the alive candidates on a `resources / max_resources` budget."""
+    share = resources / max_resources
+    tasks, settings = [], []
+    for c in alive:
+        _, estimator, n_comps = candidates[c]
+        params, by_rows = budget_params(estimator, share)
+        n_rows = resources if by_rows else max_resources
+        settings.append((params, n_rows))
+        for f, (train, test) in enumerate(folds):
+            Z_train, Z_test = prepared[f]
+            rows = orders[f][:n_rows]
+            tasks.append(delayed(_fit_score)(estimator, params, n_comps, Z_train[rows], y[train][rows],
+                                             Z_test, y[test]))
+    out = Parallel(n_jobs=n_jobs)(tasks)
+
+    records = []
+    n_folds = len(folds)
+    for k, c in enumerate(alive):
+        name, _, n_comps = candidates[c]
+        params, rows = settings[k]
+        scores = out[k * n_folds:(k + 1) * n_folds]
+        records.append({"candidate": c,
+                        "model": name,
+                        "n_components": n_comps,
+                        "budget": share,
+                        "rows": rows,
+                        "n_estimators": params.get("n_estimators"),
+                        "mean_accuracy": np.mean([acc for acc, _ in scores]),
+                        "std_accuracy": np.std([acc for acc, _ in scores]),
+                        "fit_seconds": sum(seconds for _, seconds in scores)})
+    return records
+
+
+def successive_halving(X, y, candidates, factor=3, min_resources=40, n_splits=5, n_repeats=1,
+                       n_jobs=-1, cache_dir=".ckd_cache/cv", random_state=12, exhaustive=False):
+    """Runs successive halving (or, with exhaustive=True, the full grid on full folds).
+
+    Returns one row per (rung, candidate) evaluation.
+    """
+    X = np.asarray(X, dtype=float)
+    y = np.asarray(y)
+    folds = ckd_cv.make_folds(y, n_splits, n_repeats, random_state)
+    max_components = min(X.shape[1], min(len(train) for train, _ in folds))
+    candidates = [cand for cand in candidates if cand[2] <= max_components]
+
+    prepared = Parallel(n_jobs=n_jobs)(
+        delayed(ckd_cv.preprocess_fold)(X, train, test, max_components, cache_dir, fold_id)
+        for fold_id, (train, test) in enumerate(folds))
+    prepared = [(Z_train, Z_test) for Z_train, Z_test, _, _ in prepared]
+    orders = _subsample_orders(y, folds, random_state)
+
+    max_resources = min(len(train) for train, _ in folds)
+    rungs = [max_resources] if exhaustive else budgets(min(min_resources, max_resources), max_resources, factor)
+
+    alive = list(range(len(candidates)))
+    history = []
+    for rung, resources in enumerate(rungs):
+        records = evaluate_rung(candidates, alive, prepared, y, folds, orders, resources, max_resources, n_jobs)
+        for rec in records:
+            rec["rung"] = rung
+        history += records
+        if rung == len(rungs) - 1:
+            break
+        n_keep = max(1, int(math.ceil(len(alive) / factor)))
+        records.sort(key=lambda rec: rec["mean_accuracy"], reverse=True)
+        alive = sorted(rec["candidate"] for rec in records[:n_keep])
+    return pd.DataFrame(history)
+
+
+def min_full_fit_seconds(history):
+    """Lower estimate of the exhaustive grid's fit time, from the measured fits.
+
+    Each candidate's last fit is extended to the full budget along its model's measured slope
+    (fit time against budget over every rung it was seen at), or not at all for a model only seen
+    at one budget: ensembles may stop early and small fits are dominated by fixed costs, so a
+    proportional extrapolation would overstate the savings.
+    """
+    slopes = {}
+    for model, rows in history.groupby("model"):
+        slopes[model] = max(np.polyfit(rows["budget"], rows["fit_seconds"], 1)[0], 0) \
+            if rows["budget"].nunique() > 1 else 0
+    last = history.sort_values("budget").groupby("candidate").last()
+    return float((last["fit_seconds"] + last["model"].map(slopes) * (1 - last["budget"])).sum())
+
+
+def best_of(history):
+    """Best candidate of the last rung."""
+    last = history[history["rung"] == history["rung"].max()]
+    return last.sort_values("mean_accuracy", ascending=False).iloc[0]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="chronic_kidney_disease.csv")
+    parser.add_argument("--factor", type=int, default=3, help="1/factor of the candidates survive each rung")
+    parser.add_argument("--min-resources", type=int, default=40, help="training rows per fold at the first rung")
+    parser.add_argument("--splits", type=int, default=5)
+    parser.add_argument("--repeats", type=int, default=1)
+    parser.add_argument("--jobs", type=int, default=-1)
+    parser.add_argument("--max-components", type=int, default=24)
+    parser.add_argument("--no-boost", action="store_true", help="leave the AdaBoost variants out of the grid")
+    parser.add_argument("--no-nets", action="store_true", help="leave the neural networks out of the grid")
+    parser.add_argument("--compare", action="store_true", help="also run the exhaustive grid and compare")
+    parser.add_argument("--cache-dir", default=".ckd_cache/cv")
+    parser.add_argument("--seed", type=int, default=12)
+    parser.add_argument("--out", help="CSV file for the evaluation history")
+    args = parser.parse_args(argv)
+
+    X, y = ckd_cv.load_xy(args.data)
+    candidates = grid_candidates(range(1, args.max_components + 1), not args.no_boost, not args.no_nets, args.seed)
+    n_folds = args.splits * args.repeats
+    options = dict(n_splits=args.splits, n_repeats=args.repeats, n_jobs=args.jobs,
+                   cache_dir=args.cache_dir, random_state=args.seed)
+
+    start = time.perf_counter()
+    history = successive_halving(X, y, candidates, factor=args.factor, min_resources=args.min_resources, **options)
+    elapsed = time.perf_counter() - start
+    if args.out:
+        history.to_csv(args.out, index=False)
+
+    for rung, rows in history.groupby("rung"):
+        print("Rung {}: {:4d} candidates on {:4.0%} of the budget ({} rows/fold), {:.2f}s fitting, "
+              "best {:.4f} ({} - {} components)".format(
+                  rung, len(rows), rows["budget"].iloc[0], rows["rows"].min(), rows["fit_seconds"].sum(),
+                  rows["mean_accuracy"].max(),
+                  *rows.sort_values("mean_accuracy", ascending=False)[["model", "n_components"]].iloc[0]))
+
+    best = best_of(history)
+    fit_seconds = history["fit_seconds"].sum()
+    n_candidates = history["candidate"].nunique()
+    print("\nSelected: {} with {} components, accuracy {:.4f} +/- {:.4f}".format(
+        best["model"], best["n_components"], best["mean_accuracy"], best["std_accuracy"]))
+    print("Fits: {:,} vs {:,} for the exhaustive grid".format(len(history) * n_folds, n_candidates * n_folds))
+    if not args.compare:
+        print("Fit time: {:.2f}s; the exhaustive grid needs at least ~{:.2f}s (--compare to measure it)".format(
+            fit_seconds, min_full_fit_seconds(history)))
+    print("Wall time: {:.2f}s".format(elapsed))
+
+    if args.compare:
+        start = time.perf_counter()
+        full = successive_halving(X, y, candidates, exhaustive=True, **options)
+        full_elapsed = time.perf_counter() - start
+        full_best = best_of(full)
+        print("\nExhaustive grid: {} with {} components, accuracy {:.4f} +/- {:.4f}".format(
+            full_best["model"], full_best["n_components"], full_best["mean_accuracy"], full_best["std_accuracy"]))
+        print("Fit time: {:.2f}s vs {:.2f}s for the exhaustive grid ({:.1%} saved by halving)".format(
+            fit_seconds, full["fit_seconds"].sum(), 1 - fit_seconds / full["fit_seconds"].sum()))
+        print("Wall time: {:.2f}s vs {:.2f}s ({:.1%} saved)".format(elapsed, full_elapsed, 1 - elapsed / full_elapsed))
+        print("Accuracy of the halving pick on the exhaustive grid: {:.4f} (best: {:.4f})".format(
+            full.loc[full["candidate"] == best["candidate"], "mean_accuracy"].iloc[0], full_best["mean_accuracy"]))
+
+
+if __name__ == "__main__":
+    main()
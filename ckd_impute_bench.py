@@ -0,0 +1,183 @@
+"""Imputation quality benchmark: hide observed values, re-impute them, score.
+
+The script picks the transformer to use before the KNN imputation by looking
+at the distributions after imputation. This harness measures it instead:
+
+1. a controlled fraction of the observed cells is hidden, following the real
+   missingness pattern (every row borrows the pattern of missing cells of a
+   random incomplete row, so features that are often missing, or missing
+   together, are hidden more often);
+2. the hidden cells are re-imputed by each configuration: the KNN imputer of
+   the script on the untransformed data and after each of the six
+   transformers (numerical features transformed, imputed, transformed back),
+   and alternative imputers (mean, median, most frequent, iterative);
+3. each configuration is scored on the hidden cells: normalised RMSE of the
+   numerical features, Kolmogorov-Smirnov and Wasserstein distances between
+   the hidden and the imputed values, accuracy on the categorical features,
+   along with its runtime and peak memory.
+
+Configurations and repeats run in parallel.
+
+Usage:
+    python ckd_impute_bench.py --data chronic_kidney_disease.csv --fraction 0.1 --repeats 5 --jobs -1
+"""
+
+import argparse
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.stats import ks_2samp, wasserstein_distance
+
+from sklearn.experimental import enable_iterative_imputer  # noqa: F401
+from sklearn.impute import IterativeImputer
+from sklearn.impute import KNNImputer
+from sklearn.impute import SimpleImputer
+
+import ckd_common
+
+
+def mask_like(data, fraction, rng):
+    """Boolean mask of observed cells to hide, following the real missingness pattern.
+
+    Roughly `fraction` of the observed cells of the features are hidden; the target is never hidden.
+    """
+    missing = data.isna().to_numpy()
+    observed = ~missing
+    observed[:, data.columns.get_loc(ckd_common.target)] = False
+    donors = np.flatnonzero(missing.any(axis=1))
+    if len(donors) == 0:
+        raise ValueError("the data has no missing values to take a pattern from")
+    candidates = observed & missing[rng.choice(donors, size=len(data))]
+    keep = min(1.0, fraction * observed.sum() / max(candidates.sum(), 1))
+    return candidates & (rng.random(candidates.shape) < keep)
+
+
+def knn_imputer():
+    return KNNImputer(weights='distance', n_neighbors=8)
+
+
+def configurations():
+    """(name, function(masked data) -> imputed array) of every configuration to compare."""
+    configs = [("KNN (untransformed)", lambda data: knn_imputer().fit_transform(data))]
+
+    for index, tr_name in enumerate(ckd_common.tr_names):
+        def impute(data, index=index):
+            transformer = ckd_common.make_transformers()[index]
+            numeric = [data.columns.get_loc(col) for col in ckd_common.numeric]
+            values = data.to_numpy(dtype=float, copy=True)
+            values[:, numeric] = transformer.fit_transform(values[:, numeric])
+            imputed = knn_imputer().fit_transform(values)
+            imputed[:, numeric] = transformer.inverse_transform(imputed[:, numeric])
+            return imputed
+        configs.append(("KNN + " + tr_name, impute))
+
+    for strategy in ["mean", "median", "most_frequent"]:
+        configs.append(("Simple ({})".format(strategy),
+                        lambda data, strategy=strategy: SimpleImputer(strategy=strategy).fit_transform(data)))
+    configs.append(("Iterative (Bayesian ridge)",
+                    lambda data: IterativeImputer(max_iter=10, random_state=0).fit_transform(data)))
+    return configs
+
+
+def score(truth, imputed, mask, columns, scales):
+    """Scores of the imputed values on the hidden cells, per feature and overall."""
+    per_feature = []
+    for j, col in enumerate(columns):
+        hidden = mask[:, j]
+        if not hidden.any():
+            continue
+        true, pred = truth[hidden, j], imputed[hidden, j]
+        row = {"feature": col, "hidden": int(hidden.sum())}
+        if col in ckd_common.numeric:
+            row["nrmse"] = np.sqrt(np.mean((true - pred) ** 2)) / scales[j]
+            row["ks"] = ks_2samp(true, pred).statistic
+            row["wasserstein"] = wasserstein_distance(true, pred) / scales[j]
+        else:
+            row["accuracy"] = np.mean(np.round(pred) == true)
+        per_feature.append(row)
+    per_feature = pd.DataFrame(per_feature)
+    overall = {key: per_feature[key].mean() for key in ["nrmse", "ks", "wasserstein", "accuracy"]
+               if key in per_feature}
+    return overall, per_feature
+
+
+def run_config(name, impute, data, fraction, seed):
+    """Hides, re-imputes and scores one (configuration, repeat)."""
+    rng = np.random.default_rng(seed)
+    mask = mask_like(data, fraction, rng)
+    truth = data.to_numpy(dtype=float)
+    masked = data.mask(mask)
+    scales = np.nanstd(truth, axis=0)
+    scales[scales == 0] = 1
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        start = time.perf_counter()
+        imputed = impute(masked)
+        seconds = time.perf_counter() - start
+        #Peak memory from a second, traced run, so that tracing does not skew the timing
+        tracemalloc.start()
+        try:
+            impute(masked)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        overall, per_feature = score(truth, imputed, mask, list(data.columns), scales)
+
+    overall.update({"config": name, "seed": seed, "hidden": int(mask.sum()),
+                    "seconds": seconds, "peak_mb": peak / 2**20})
+    per_feature.insert(0, "config", name)
+    per_feature.insert(1, "seed", seed)
+    return overall, per_feature
+
+
+def benchmark(data, fraction=0.1, repeats=5, n_jobs=-1, seed=0, configs=None):
+    """Runs every configuration `repeats` times; returns (runs, per_feature)."""
+    if configs is None:
+        configs = configurations()
+    out = Parallel(n_jobs=n_jobs)(delayed(run_config)(name, impute, data, fraction, seed + repeat)
+                                  for repeat in range(repeats) for name, impute in configs)
+    runs = pd.DataFrame([overall for overall, _ in out])
+    per_feature = pd.concat([features for _, features in out], ignore_index=True)
+    return runs, per_feature
+
+
+def summarize(runs):
+    """Mean (and spread of the RMSE) over repeats per configuration, best RMSE first."""
+    summary = runs.groupby("config").agg(nrmse=("nrmse", "mean"), nrmse_std=("nrmse", "std"),
+                                         ks=("ks", "mean"), wasserstein=("wasserstein", "mean"),
+                                         accuracy=("accuracy", "mean"), seconds=("seconds", "mean"),
+                                         peak_mb=("peak_mb", "mean"))
+    return summary.sort_values("nrmse").reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="chronic_kidney_disease.csv")
+    parser.add_argument("--fraction", type=float, default=0.1, help="fraction of the observed cells to hide")
+    parser.add_argument("--repeats", type=int, default=5, help="maskings per configuration")
+    parser.add_argument("--jobs", type=int, default=-1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="CSV file for the per-run scores")
+    parser.add_argument("--per-feature", help="CSV file for the per-feature scores")
+    args = parser.parse_args(argv)
+
+    data = ckd_common.clean(ckd_common.load_data(args.data))
+    start = time.perf_counter()
+    runs, per_feature = benchmark(data, args.fraction, args.repeats, args.jobs, args.seed)
+    if args.out:
+        runs.to_csv(args.out, index=False)
+    if args.per_feature:
+        per_feature.to_csv(args.per_feature, index=False)
+
+    print(summarize(runs).to_string(index=False, float_format="%.4f"))
+    print("\n{} runs, {:.0f} hidden cells per run on average, in {:.1f}s".format(
+        len(runs), runs["hidden"].mean(), time.perf_counter() - start))
+
+
+if __name__ == "__main__":
+    main()
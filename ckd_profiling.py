@@ -0,0 +1,294 @@
+"""Stage-level profiling of the analysis.
+
+Every stage (and inner loop iteration) of the script is wrapped in a span:
+
+    span = ckd_profiling.stage("Imputation", rows=data.shape[0])
+    ...
+    span.stop()
+
+or, equivalently, `with ckd_profiling.stage(...):`. A span records its wall
+time, CPU time, the peak resident set size reached while it ran and the
+number of rows it processed. When profiling is enabled, a summary table is printed at
+exit and the spans can be written as a Chrome trace-event JSON file (open it
+in chrome://tracing or https://ui.perfetto.dev).
+
+Profiling is off by default: `stage()` then returns a shared no-op span, so
+the instrumentation costs one function call per stage.
+
+The peak RSS of a span is measured by resetting the kernel's high-water mark
+(VmHWM) when it starts, which needs Linux. Elsewhere, a span only gets the
+peak of the process so far, which tells little about the stages after the
+largest one.
+
+Tasks run by ckd_executor are timed where they run (possibly in another
+process) and recorded with `task()`; they show in the trace on one track per
+worker.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    """Peak resident set size of the process so far, in MB (None if unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #ru_maxrss is in kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024) if os.uname().sysname == "Darwin" else peak / 1024
+
+
+def _status_mb(field):
+    """A memory field of /proc/self/status (VmRSS, VmHWM...) in MB."""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1]) / 1024
+    raise OSError("no {} in /proc/self/status".format(field))
+
+
+def reset_peak_rss():
+    """Resets the peak RSS (VmHWM) of the process to its current RSS; False if that is not supported."""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        _status_mb("VmHWM")
+        return True
+    except OSError:
+        return False
+
+
+class _NullSpan:
+    """What `stage()` returns when profiling is off."""
+
+    def stop(self, rows=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class Span:
+    """A running stage; stop() (or leaving the with block) records it."""
+
+    def __init__(self, profiler, name, rows, args):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+        self.args = args
+        self.tid = threading.get_ident()
+        self.stopped = False
+        self.peak = None
+        profiler._start(self)
+        self.start_wall = time.perf_counter()
+        self.start_cpu = time.process_time()
+
+    def stop(self, rows=None):
+        if self.stopped:
+            return
+        self.stopped = True
+        wall = time.perf_counter() - self.start_wall
+        cpu = time.process_time() - self.start_cpu
+        if rows is not None:
+            self.rows = rows
+        self.profiler._record(self, wall, cpu, self.profiler._stop(self))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+
+class Profiler:
+    """Collects the spans of one run."""
+
+    def __init__(self):
+        self.origin = time.perf_counter()
+        self.origin_time = time.time()
+        self.records = []
+        self._lock = threading.Lock()
+        #Spans started and not stopped yet, and whether the peak RSS can be reset for each span
+        self._open = []
+        self.per_span_peak = reset_peak_rss()
+
+    def stage(self, name, rows=None, **args):
+        return Span(self, name, rows, args)
+
+    def _propagate_peak(self):
+        #Every open span has seen the high-water mark since the last reset
+        hwm = _status_mb("VmHWM")
+        for span in self._open:
+            span.peak = max(span.peak, hwm)
+
+    def _start(self, span):
+        with self._lock:
+            if self.per_span_peak:
+                self._propagate_peak()
+                reset_peak_rss()
+                span.peak = _status_mb("VmRSS")
+            self._open.append(span)
+
+    def _stop(self, span):
+        """Peak RSS reached during `span`, in MB."""
+        with self._lock:
+            if not self.per_span_peak:
+                self._open.remove(span)
+                return peak_rss_mb()
+            self._propagate_peak()
+            self._open.remove(span)
+            return span.peak
+
+    def _record(self, span, wall, cpu, peak):
+        with self._lock:
+            self.records.append({"name": span.name,
+                                 "start": span.start_wall - self.origin,
+                                 "wall": wall,
+                                 "cpu": cpu,
+                                 "peak_rss_mb": peak,
+                                 "rows": span.rows,
+                                 "args": span.args,
+                                 "tid": span.tid})
+
+    def add(self, name, started, wall, cpu, worker, rows=None, args=None):
+        """Records a span measured elsewhere; `started` is a time.time() timestamp."""
+        with self._lock:
+            self.records.append({"name": name,
+                                 "start": started - self.origin_time,
+                                 "wall": wall,
+                                 "cpu": cpu,
+                                 "peak_rss_mb": None,
+                                 "rows": rows,
+                                 "args": args or {},
+                                 "tid": worker})
+
+    def trace_events(self):
+        """The spans as Chrome trace 'complete' events plus a peak RSS counter."""
+        pid = os.getpid()
+        events = []
+        workers = {}
+
+        def tid(value):
+            #Spans of executor workers are on a named track each
+            if isinstance(value, int):
+                return value
+            if value not in workers:
+                workers[value] = len(workers) + 1
+                events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": workers[value],
+                               "args": {"name": value}})
+            return workers[value]
+
+        for rec in self.records:
+            args = {"cpu_ms": round(rec["cpu"] * 1e3, 3)}
+            if rec["peak_rss_mb"] is not None:
+                args["peak_rss_mb"] = round(rec["peak_rss_mb"], 1)
+            if rec["rows"] is not None:
+                args["rows"] = rec["rows"]
+            args.update({key: str(value) for key, value in rec["args"].items()})
+            events.append({"name": rec["name"], "cat": "stage", "ph": "X", "pid": pid, "tid": tid(rec["tid"]),
+                           "ts": round(rec["start"] * 1e6, 1), "dur": round(rec["wall"] * 1e6, 1),
+                           "args": args})
+            if rec["peak_rss_mb"] is not None:
+                events.append({"name": "peak RSS (MB)", "ph": "C", "pid": pid,
+                               "ts": round((rec["start"] + rec["wall"]) * 1e6, 1),
+                               "args": {"peak": round(rec["peak_rss_mb"], 1)}})
+        return sorted(events, key=lambda event: event.get("ts", 0))
+
+    def write_trace(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+
+    def summary(self):
+        """Per stage name: calls, total wall/CPU time, peak RSS and rows, in first-seen order."""
+        stages = {}
+        for rec in sorted(self.records, key=lambda rec: rec["start"]):
+            row = stages.setdefault(rec["name"], {"name": rec["name"], "calls": 0, "wall": 0.0, "cpu": 0.0,
+                                                  "peak_rss_mb": None, "rows": None})
+            row["calls"] += 1
+            row["wall"] += rec["wall"]
+            row["cpu"] += rec["cpu"]
+            if rec["peak_rss_mb"] is not None:
+                row["peak_rss_mb"] = max(row["peak_rss_mb"] or 0, rec["peak_rss_mb"])
+            if rec["rows"] is not None:
+                row["rows"] = (row["rows"] or 0) + rec["rows"]
+        return list(stages.values())
+
+    def format_summary(self):
+        rows = self.summary()
+        width = max([len("Stage")] + [len(row["name"]) for row in rows])
+        lines = ["{:<{w}}  {:>6}  {:>10}  {:>10}  {:>13}  {:>10}".format(
+            "Stage", "Calls", "Wall (s)", "CPU (s)", "Peak RSS (MB)", "Rows", w=width)]
+        lines.append("-" * len(lines[0]))
+        for row in rows:
+            lines.append("{:<{w}}  {:>6}  {:>10.3f}  {:>10.3f}  {:>13}  {:>10}".format(
+                row["name"], row["calls"], row["wall"], row["cpu"],
+                "-" if row["peak_rss_mb"] is None else "{:.1f}".format(row["peak_rss_mb"]),
+                "-" if row["rows"] is None else row["rows"], w=width))
+        return "\n".join(lines)
+
+
+_profiler = None
+
+
+def stage(name, rows=None, **args):
+    """Starts a span named `name` (a no-op unless profiling is enabled)."""
+    if _profiler is None:
+        return _NULL_SPAN
+    return _profiler.stage(name, rows, **args)
+
+
+def task(name, started, wall, cpu, worker, rows=None, **args):
+    """Records a task timed by an executor worker (a no-op unless profiling is enabled)."""
+    if _profiler is not None:
+        _profiler.add(name, started, wall, cpu, worker, rows, args)
+
+
+def enabled():
+    return _profiler is not None
+
+
+def enable(trace_path=None, summary=True):
+    """Turns profiling on; the summary and trace file are written at exit."""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+        atexit.register(report, trace_path, summary)
+    return _profiler
+
+
+def report(trace_path=None, summary=True):
+    if _profiler is None:
+        return
+    if summary:
+        print("\n" + _profiler.format_summary())
+    if trace_path:
+        _profiler.write_trace(trace_path)
+        print("Trace written to {}".format(trace_path))
+
+
+def add_arguments(parser):
+    """Adds the --profile/--trace command line switches to an argparse parser."""
+    parser.add_argument("--profile", action="store_true",
+                        help="print wall/CPU time, peak RSS and rows per stage at exit")
+    parser.add_argument("--trace", metavar="PATH",
+                        help="write a Chrome trace-event JSON file of the stages (implies --profile)")
+
+
+def enable_from_args(args):
+    if args.profile or args.trace:
+        enable(trace_path=args.trace)
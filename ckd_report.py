@@ -0,0 +1,435 @@
+"""Static HTML report of the exploratory analysis.
+
+Instead of rendering the EDA as a series of huge matplotlib canvases, the
+numbers behind every figure are computed once as compact aggregates (value
+counts, binned densities, quartiles, contingency tables, correlations) and
+drawn as small inline SVG charts and shaded tables in a single, self-contained
+HTML file that can be shared as it is.
+
+Every section is rendered from its aggregates only, and cached on disk under a
+hash of them and of its rendering code (the section's render function and the
+helpers and constants it uses): a rerun only regenerates the sections whose
+data or rendering changed.
+
+Usage:
+    python ckd_report.py --data chronic_kidney_disease.csv --out ckd_report.html
+"""
+
+import argparse
+import html
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import ckd_common
+
+n_bins = 30
+
+#Bins of the per-category densities of the numerical x categorical violins
+violin_bins = 20
+
+palette = ["#4c72b0", "#dd8452", "#55a868", "#c44e52", "#8172b3", "#937860", "#da8bc3", "#8c8c8c"]
+
+
+#Aggregates
+
+def _label(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _counts(series):
+    counts = series.value_counts().sort_index()
+    return {"labels": [_label(v) for v in counts.index], "counts": counts.tolist(),
+            "missing": int(series.isna().sum())}
+
+
+def _quartiles(values):
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return None
+    q1, median, q3 = np.percentile(values, [25, 50, 75])
+    iqr = q3 - q1
+    inside = values[(values >= q1 - 1.5 * iqr) & (values <= q3 + 1.5 * iqr)]
+    return {"min": float(values.min()), "q1": float(q1), "median": float(median), "q3": float(q3),
+            "max": float(values.max()), "low": float(inside.min()), "high": float(inside.max()),
+            "outliers": int(len(values) - len(inside))}
+
+
+def _table(a, b):
+    table = pd.crosstab(a, b)
+    return {"rows": [_label(v) for v in table.index], "columns": [_label(v) for v in table.columns],
+            "values": table.to_numpy().tolist()}
+
+
+def _violins(values, groups, edges):
+    """Binned density (over shared `edges`) and quartiles of `values` within each category of `groups`."""
+    out = {}
+    for group in sorted(groups.dropna().unique()):
+        observed = values[(groups == group).to_numpy()]
+        observed = observed[~np.isnan(observed)]
+        if len(observed) > 1:
+            density = np.histogram(observed, bins=edges, density=True)[0]
+        else:
+            density = np.zeros(len(edges) - 1)
+        out[_label(group)] = {"n": int(len(observed)), "density": np.nan_to_num(density).tolist(),
+                              "quartiles": _quartiles(observed)}
+    return out
+
+
+def compute_aggregates(data):
+    """All the numbers the report needs, as plain JSON-serializable data, grouped by section."""
+    numeric, categoricals, target = ckd_common.numeric, ckd_common.categoricals, ckd_common.target
+    n = len(data)
+
+    numerical = {}
+    for col in numeric:
+        values = data[col].to_numpy(dtype=float)
+        observed = values[~np.isnan(values)]
+        density, edges = np.histogram(observed, bins=n_bins, density=True) if len(observed) else ([], [])
+        numerical[col] = {"missing": float(1 - len(observed) / n),
+                          "mean": float(np.mean(observed)) if len(observed) else None,
+                          "std": float(np.std(observed, ddof=1)) if len(observed) > 1 else None,
+                          "edges": np.asarray(edges).tolist(), "density": np.asarray(density).tolist(),
+                          "quartiles": _quartiles(values)}
+
+    by_target = {}
+    classes = sorted(data[target].dropna().unique())
+    for col in numeric:
+        by_target[col] = {_label(c): _quartiles(data.loc[data[target] == c, col].to_numpy(dtype=float))
+                          for c in classes}
+
+    violins = {"numeric": numeric, "categoricals": categoricals, "edges": {}, "cells": []}
+    for col in numeric:
+        values = data[col].to_numpy(dtype=float)
+        observed = values[~np.isnan(values)]
+        edges = np.histogram_bin_edges(observed, bins=violin_bins) if len(observed) else np.array([0.0, 1.0])
+        violins["edges"][col] = edges.tolist()
+        violins["cells"].append([_violins(values, data[cat], edges) for cat in categoricals])
+
+    return {
+        "overview": {"rows": n, "columns": data.shape[1],
+                     "missing": data.isna().mean().sort_values(ascending=False).round(4).to_dict()},
+        "categorical": {col: _counts(data[col]) for col in categoricals + [target]},
+        "numerical": numerical,
+        "correlation": {"columns": numeric,
+                        "values": data[numeric].corr("pearson").round(4).fillna(0).to_numpy().tolist()},
+        "crosstabs": {"columns": categoricals,
+                      "tables": [[_table(data[a], data[b]) for b in categoricals] for a in categoricals]},
+        "categorical_vs_target": {col: _table(data[col], data[target]) for col in categoricals},
+        "numerical_vs_target": by_target,
+        "numerical_by_categorical": violins,
+    }
+
+
+#SVG and HTML helpers
+
+def _fmt(x):
+    return "{:.4g}".format(x)
+
+
+def svg_bars(labels, values, width=260, height=120, color=palette[0], percent=False):
+    """Vertical bar chart."""
+    top = max(values) if values and max(values) > 0 else 1
+    bar_w = (width - 10) / max(len(values), 1)
+    parts = []
+    for i, (label, value) in enumerate(zip(labels, values)):
+        h = (height - 30) * value / top
+        x = 5 + i * bar_w
+        text = "{:.1%}".format(value) if percent else _fmt(value)
+        parts.append('<rect x="{:.1f}" y="{:.1f}" width="{:.1f}" height="{:.1f}" fill="{}">'
+                     '<title>{}: {}</title></rect>'.format(x + 2, height - 18 - h, bar_w - 4, h, color,
+                                                          html.escape(label), text))
+        parts.append('<text x="{:.1f}" y="{}" font-size="10" text-anchor="middle">{}</text>'.format(
+            x + bar_w / 2, height - 5, html.escape(label[:12])))
+        parts.append('<text x="{:.1f}" y="{:.1f}" font-size="9" text-anchor="middle">{}</text>'.format(
+            x + bar_w / 2, height - 21 - h, text))
+    return '<svg width="{}" height="{}">{}</svg>'.format(width, height, "".join(parts))
+
+
+def svg_hbars(labels, values, width=520, bar_h=14, color=palette[1]):
+    """Horizontal bar chart of proportions."""
+    label_w = 230
+    top = max(values) if values and max(values) > 0 else 1
+    parts = []
+    for i, (label, value) in enumerate(zip(labels, values)):
+        y = i * (bar_h + 3)
+        w = (width - label_w - 50) * value / top
+        parts.append('<text x="{}" y="{}" font-size="10" text-anchor="end">{}</text>'.format(
+            label_w - 5, y + bar_h - 3, html.escape(label)))
+        parts.append('<rect x="{}" y="{}" width="{:.1f}" height="{}" fill="{}"></rect>'.format(
+            label_w, y, w, bar_h, color))
+        parts.append('<text x="{:.1f}" y="{}" font-size="10">{:.1%}</text>'.format(
+            label_w + w + 4, y + bar_h - 3, value))
+    return '<svg width="{}" height="{}">{}</svg>'.format(width, len(values) * (bar_h + 3), "".join(parts))
+
+
+def svg_histogram(edges, density, width=260, height=110, color=palette[2]):
+    if not density:
+        return ""
+    top = max(density) or 1
+    lo, hi = edges[0], edges[-1]
+    span = (hi - lo) or 1
+    parts = []
+    for left, right, d in zip(edges[:-1], edges[1:], density):
+        x = 5 + (width - 10) * (left - lo) / span
+        w = (width - 10) * (right - left) / span
+        h = (height - 20) * d / top
+        parts.append('<rect x="{:.1f}" y="{:.1f}" width="{:.1f}" height="{:.1f}" fill="{}">'
+                     '<title>[{}, {}): {}</title></rect>'.format(x, height - 15 - h, max(w - 0.5, 0.5), h, color,
+                                                                 _fmt(left), _fmt(right), _fmt(d)))
+    parts.append('<text x="5" y="{}" font-size="9">{}</text>'.format(height - 3, _fmt(lo)))
+    parts.append('<text x="{}" y="{}" font-size="9" text-anchor="end">{}</text>'.format(
+        width - 5, height - 3, _fmt(hi)))
+    return '<svg width="{}" height="{}">{}</svg>'.format(width, height, "".join(parts))
+
+
+def svg_boxes(boxes, width=260, box_h=16, colors=palette):
+    """Horizontal box plots ({name: quartiles}) sharing one axis."""
+    boxes = {name: q for name, q in boxes.items() if q is not None}
+    if not boxes:
+        return ""
+    lo = min(q["min"] for q in boxes.values())
+    hi = max(q["max"] for q in boxes.values())
+    span = (hi - lo) or 1
+    label_w = 40
+
+    def x(v):
+        return label_w + (width - label_w - 10) * (v - lo) / span
+
+    parts = []
+    for i, (name, q) in enumerate(boxes.items()):
+        y = 4 + i * (box_h + 8)
+        mid = y + box_h / 2
+        color = colors[i % len(colors)]
+        parts.append('<text x="{}" y="{:.1f}" font-size="10" text-anchor="end">{}</text>'.format(
+            label_w - 4, mid + 3, html.escape(name)))
+        parts.append('<line x1="{:.1f}" x2="{:.1f}" y1="{:.1f}" y2="{:.1f}" stroke="#555"></line>'.format(
+            x(q["low"]), x(q["high"]), mid, mid))
+        parts.append('<rect x="{:.1f}" y="{}" width="{:.1f}" height="{}" fill="{}" fill-opacity="0.6" stroke="#333">'
+                     '<title>min {} | Q1 {} | median {} | Q3 {} | max {} | {} outliers</title></rect>'.format(
+                         x(q["q1"]), y, max(x(q["q3"]) - x(q["q1"]), 1), box_h, color, _fmt(q["min"]), _fmt(q["q1"]),
+                         _fmt(q["median"]), _fmt(q["q3"]), _fmt(q["max"]), q["outliers"]))
+        parts.append('<line x1="{0:.1f}" x2="{0:.1f}" y1="{1}" y2="{2}" stroke="#000" stroke-width="2"></line>'.format(
+            x(q["median"]), y, y + box_h))
+    height = 4 + len(boxes) * (box_h + 8) + 12
+    parts.append('<text x="{}" y="{}" font-size="9">{}</text>'.format(label_w, height - 2, _fmt(lo)))
+    parts.append('<text x="{}" y="{}" font-size="9" text-anchor="end">{}</text>'.format(
+        width - 10, height - 2, _fmt(hi)))
+    return '<svg width="{}" height="{}">{}</svg>'.format(width, height, "".join(parts))
+
+
+def svg_violins(edges, groups, width=150, height=110, color=palette[0]):
+    """Vertical violins ({category: {density, quartiles}}) over a shared value axis, with their quartile boxes."""
+    groups = {name: g for name, g in groups.items() if g["quartiles"] is not None}
+    if not groups:
+        return ""
+    lo, hi = edges[0], edges[-1]
+    span = (hi - lo) or 1
+    top = max(max(g["density"]) for g in groups.values()) or 1
+    slot = (width - 30) / len(groups)
+
+    def y(v):
+        return 5 + (height - 25) * (1 - (v - lo) / span)
+
+    centers = [(a + b) / 2 for a, b in zip(edges[:-1], edges[1:])]
+    parts = []
+    for i, (name, g) in enumerate(groups.items()):
+        mid = 30 + slot * (i + 0.5)
+        half = [0.45 * slot * d / top for d in g["density"]]
+        outline = ([(mid + w, y(c)) for c, w in zip(centers, half)] +
+                   [(mid - w, y(c)) for c, w in reversed(list(zip(centers, half)))])
+        q = g["quartiles"]
+        parts.append('<polygon points="{}" fill="{}" fill-opacity="0.5" stroke="{}">'
+                     '<title>{}: n={} | Q1 {} | median {} | Q3 {}</title></polygon>'.format(
+                         " ".join("{:.1f},{:.1f}".format(px, py) for px, py in outline), color, color,
+                         html.escape(name), g["n"], _fmt(q["q1"]), _fmt(q["median"]), _fmt(q["q3"])))
+        parts.append('<rect x="{:.1f}" y="{:.1f}" width="4" height="{:.1f}" fill="#333"></rect>'.format(
+            mid - 2, y(q["q3"]), max(y(q["q1"]) - y(q["q3"]), 1)))
+        parts.append('<circle cx="{:.1f}" cy="{:.1f}" r="2" fill="#fff"></circle>'.format(mid, y(q["median"])))
+        parts.append('<text x="{:.1f}" y="{}" font-size="9" text-anchor="middle">{}</text>'.format(
+            mid, height - 5, html.escape(name[:8])))
+    parts.append('<text x="2" y="10" font-size="8">{}</text>'.format(_fmt(hi)))
+    parts.append('<text x="2" y="{}" font-size="8">{}</text>'.format(height - 18, _fmt(lo)))
+    return '<svg width="{}" height="{}">{}</svg>'.format(width, height, "".join(parts))
+
+
+def _shade(value, top, rgb=(76, 114, 176)):
+    alpha = 0 if not top else abs(value) / top
+    return "background: rgba({},{},{},{:.2f})".format(*rgb, alpha * 0.85)
+
+
+def html_table(table, title=None, row_title="", col_title=""):
+    """Contingency table with cells shaded by count."""
+    top = max((v for row in table["values"] for v in row), default=0)
+    head = "".join("<th>{}</th>".format(html.escape(c)) for c in table["columns"])
+    body = "".join("<tr><th>{}</th>{}</tr>".format(
+        html.escape(r), "".join('<td style="{}">{}</td>'.format(_shade(v, top), v) for v in row))
+        for r, row in zip(table["rows"], table["values"]))
+    caption = "<caption>{}</caption>".format(html.escape(title)) if title else ""
+    return ('<table class="ct">{}<tr><th title="{}">{}</th>{}</tr>{}</table>'.format(
+        caption, html.escape(col_title), html.escape(row_title[:10]), head, body))
+
+
+#Sections: each one is rendered from its own aggregates only
+
+def render_overview(agg):
+    missing = agg["missing"]
+    return ("<p>{rows} rows, {columns} columns.</p><h3>Proportions of missing values</h3>{chart}".format(
+        rows=agg["rows"], columns=agg["columns"],
+        chart=svg_hbars(list(missing), list(missing.values()))))
+
+
+def render_categorical(agg):
+    cards = []
+    for col, counts in agg.items():
+        total = sum(counts["counts"]) + counts["missing"]
+        shares = [c / total for c in counts["counts"]]
+        cards.append('<div class="card"><h4>{}</h4><p>{:.2%} missing</p>{}</div>'.format(
+            html.escape(col), counts["missing"] / total if total else 0,
+            svg_bars(counts["labels"], shares, percent=True)))
+    return '<div class="grid">{}</div>'.format("".join(cards))
+
+
+def render_numerical(agg):
+    cards = []
+    for col, stats in agg.items():
+        summary = "{:.2%} missing".format(stats["missing"])
+        if stats["mean"] is not None:
+            summary += " &middot; mean {} &middot; median {} &middot; std {}".format(
+                _fmt(stats["mean"]), _fmt(stats["quartiles"]["median"]),
+                _fmt(stats["std"]) if stats["std"] is not None else "-")
+        cards.append('<div class="card"><h4>{}</h4><p>{}</p>{}{}</div>'.format(
+            html.escape(col), summary, svg_histogram(stats["edges"], stats["density"]),
+            svg_boxes({"": stats["quartiles"]})))
+    return '<div class="grid">{}</div>'.format("".join(cards))
+
+
+def render_correlation(agg):
+    columns, values = agg["columns"], agg["values"]
+    head = "".join('<th class="rot"><div>{}</div></th>'.format(html.escape(c)) for c in columns)
+    rows = []
+    for col, row in zip(columns, values):
+        cells = "".join('<td style="{}" title="{:.2%}">{:.0f}</td>'.format(
+            _shade(v, 1, (76, 114, 176) if v >= 0 else (196, 78, 82)), v, 100 * v) for v in row)
+        rows.append("<tr><th>{}</th>{}</tr>".format(html.escape(col), cells))
+    return ('<p>Pearson correlations, in %.</p><table class="corr"><tr><th></th>{}</tr>{}</table>'.format(
+        head, "".join(rows)))
+
+
+def render_crosstabs(agg):
+    columns = agg["columns"]
+    cells = []
+    for a, row in zip(columns, agg["tables"]):
+        for b, table in zip(columns, row):
+            cells.append('<div>{}</div>'.format(html_table(table, "{} / {}".format(a, b), a, b)))
+    return '<div class="grid small">{}</div>'.format("".join(cells))
+
+
+def render_categorical_vs_target(agg):
+    return '<div class="grid">{}</div>'.format("".join(
+        '<div class="card">{}</div>'.format(html_table(table, col, col, "Disease")) for col, table in agg.items()))
+
+
+def render_numerical_vs_target(agg):
+    names = {"0": "No CKD", "1": "CKD"}
+    return '<div class="grid">{}</div>'.format("".join(
+        '<div class="card"><h4>{}</h4>{}</div>'.format(
+            html.escape(col), svg_boxes({names.get(k, k): q for k, q in boxes.items()}))
+        for col, boxes in agg.items()))
+
+
+def render_numerical_by_categorical(agg):
+    head = "".join("<th>{}</th>".format(html.escape(cat)) for cat in agg["categoricals"])
+    rows = []
+    for col, cells in zip(agg["numeric"], agg["cells"]):
+        rows.append("<tr><th>{}</th>{}</tr>".format(html.escape(col), "".join(
+            "<td>{}</td>".format(svg_violins(agg["edges"][col], groups, color=palette[j % len(palette)]))
+            for j, groups in enumerate(cells))))
+    return ('<p>Distribution of each numerical feature (rows) within each category of each categorical '
+            'feature (columns), with its quartiles.</p><table class="violins"><tr><th></th>{}</tr>{}</table>'.format(
+                head, "".join(rows)))
+
+
+sections = [("overview", "Overview", render_overview),
+            ("categorical", "Categorical features", render_categorical),
+            ("numerical", "Numerical features: densities and quartiles", render_numerical),
+            ("correlation", "Correlations between numerical features", render_correlation),
+            ("crosstabs", "Crosstabs of categorical features", render_crosstabs),
+            ("categorical_vs_target", "Categorical features vs target", render_categorical_vs_target),
+            ("numerical_vs_target", "Numerical features vs target", render_numerical_vs_target),
+            ("numerical_by_categorical", "Numerical and categorical features: distributions",
+             render_numerical_by_categorical)]
+
+style = """
+body { font-family: sans-serif; margin: 2em; color: #222; }
+h2 { border-bottom: 1px solid #ccc; padding-bottom: .2em; margin-top: 2em; }
+h4 { margin: .2em 0; font-size: 13px; }
+p { margin: .2em 0 .5em; font-size: 12px; color: #555; }
+.grid { display: flex; flex-wrap: wrap; gap: 12px; }
+.card { border: 1px solid #ddd; border-radius: 4px; padding: 8px; }
+table { border-collapse: collapse; font-size: 11px; }
+td, th { border: 1px solid #ddd; padding: 2px 5px; text-align: right; }
+caption { font-weight: bold; font-size: 11px; padding: 2px; }
+.small table { font-size: 9px; }
+.corr td { width: 26px; }
+.violins td { padding: 0; }
+.violins th { font-size: 10px; max-width: 150px; }
+.rot { height: 150px; vertical-align: bottom; }
+.rot div { writing-mode: vertical-rl; transform: rotate(180deg); }
+"""
+
+
+def render_section(key, title, render, agg, cache_dir):
+    """HTML of one section, from the cache when its aggregates did not change. Returns (html, cached)."""
+    digest = ckd_common.digest(key, ckd_common.code_digest(render), json.dumps(agg, sort_keys=True, default=str))
+    path = os.path.join(cache_dir, "{}-{}.html".format(key, digest)) if cache_dir else None
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return f.read(), True
+    fragment = '<section id="{}"><h2>{}</h2>{}</section>'.format(key, html.escape(title), render(agg))
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            f.write(fragment)
+        os.replace(path + ".tmp", path)
+    return fragment, False
+
+
+def build_report(data, out="ckd_report.html", cache_dir=".ckd_cache/report", title="Chronic Kidney Disease: EDA"):
+    """Writes the report; returns {section: cached} telling which sections were reused."""
+    aggregates = compute_aggregates(data)
+    fragments, status = [], {}
+    for key, section_title, render in sections:
+        fragment, status[key] = render_section(key, section_title, render, aggregates[key], cache_dir)
+        fragments.append(fragment)
+    toc = "".join('<li><a href="#{}">{}</a></li>'.format(key, html.escape(t)) for key, t, _ in sections)
+    with open(out, "w") as f:
+        f.write('<!DOCTYPE html><html><head><meta charset="utf-8"><title>{0}</title><style>{1}</style></head>'
+                '<body><h1>{0}</h1><ul>{2}</ul>{3}</body></html>'.format(html.escape(title), style, toc,
+                                                                           "".join(fragments)))
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="chronic_kidney_disease.csv")
+    parser.add_argument("--out", default="ckd_report.html")
+    parser.add_argument("--cache-dir", default=".ckd_cache/report")
+    parser.add_argument("--no-cache", action="store_true")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    data = ckd_common.clean(ckd_common.load_data(args.data))
+    status = build_report(data, args.out, None if args.no_cache else args.cache_dir)
+    reused = [key for key, cached in status.items() if cached]
+    print("{} written in {:.2f}s: {} sections regenerated, {} reused from the cache".format(
+        args.out, time.perf_counter() - start, len(status) - len(reused), len(reused)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""Incremental stage-graph runner with a content-addressed cache.
+
+The analysis is declared as a graph of stages, each with explicit inputs
+(other stages) and parameters:
+
+    load -> clean -> transform/<transformer> -> impute/<transformer>
+                  -> impute/Original -> split -> pca_sweep
+                                              -> model_grid/<model>
+                                              -> boosting/<model>
+                                              -> nn
+                  -> eda_stats
+
+The output of every stage is cached on disk under a hash of its code (with
+the helpers and module-level constants of the project it uses, such as the
+typo table of ckd_common), its parameters and the hashes of its inputs (the
+raw file's content for `load`).
+A rerun only executes the stages whose hash changed, and loads cached outputs
+only when a stage that does run needs them. Every run reports the cache hits
+and the time they saved.
+
+Usage:
+    python ckd_stages.py --data chronic_kidney_disease.csv
+    python ckd_stages.py --targets "model_grid/.*" --force "model_grid/SVM_RBF"
+"""
+
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import re
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from sklearn.decomposition import PCA
+from sklearn.discriminant_analysis import LinearDiscriminantAnalysis
+from sklearn.impute import KNNImputer
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import RobustScaler
+from sklearn.svm import SVC
+
+import ckd_common
+import ckd_executor
+
+#Bump to invalidate every cached output (e.g. after changing a helper the stages rely on)
+CODE_VERSION = 1
+
+
+def file_digest(path, block_size=1 << 20):
+    """Hash of a file's content."""
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+
+def code_digest(*objects):
+    """Hash of the source code of functions or modules, and of the helpers and constants they use."""
+    return ckd_common.code_digest(*objects)
+
+
+class Stage:
+
+    def __init__(self, name, func, inputs, params, code, files):
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.params = params
+        self.code = code
+        self.files = files
+
+
+class StageGraph:
+    """Stages declared in dependency order, run with an on-disk cache."""
+
+    def __init__(self, cache_dir=".ckd_cache/stages"):
+        self.cache_dir = cache_dir
+        self.stages = {}
+
+    def add(self, name, func, inputs=(), depends_on=(), files=(), **params):
+        """Declares `name = func(*inputs, **params)`.
+
+        `depends_on` lists extra functions or modules whose code the stage
+        relies on, `files` the paths whose content is part of its inputs.
+        """
+        for dep in inputs:
+            if dep not in self.stages:
+                raise ValueError("stage {!r} depends on undeclared stage {!r}".format(name, dep))
+        code = code_digest(func, *depends_on)
+        self.stages[name] = Stage(name, func, inputs, params, code, list(files))
+        return name
+
+    def keys(self):
+        """The content hash of every stage."""
+        keys = {}
+        for name, stage in self.stages.items():
+            keys[name] = ckd_common.digest(CODE_VERSION, name, stage.code, sorted(stage.params.items()),
+                                           [keys[dep] for dep in stage.inputs],
+                                           [file_digest(path) for path in stage.files])
+        return keys
+
+    def _path(self, name, key):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", name)
+        return os.path.join(self.cache_dir, "{}-{}".format(slug, key))
+
+    def run(self, targets=None, force=None, load=True, verbose=True):
+        """Brings `targets` (default: every stage) up to date and returns their outputs.
+
+        `force` is a regular expression of stage names to rerun regardless of the cache.
+        With load=False, cached targets are only checked, not read (their output is None).
+        Returns (outputs, report) where report has one row per stage that was needed.
+        """
+        if targets is None:
+            targets = list(self.stages)
+        keys = self.keys()
+        os.makedirs(self.cache_dir, exist_ok=True)
+        values = {}
+        report = []
+
+        def cached(name):
+            path = self._path(name, keys[name])
+            if force and re.fullmatch(force, name):
+                return None
+            if os.path.exists(path + ".pkl") and os.path.exists(path + ".json"):
+                return path
+            return None
+
+        def resolve(name, need=True):
+            if name in values:
+                return values[name]
+            stage = self.stages[name]
+            path = cached(name)
+            start = time.perf_counter()
+            if path is not None:
+                value = joblib.load(path + ".pkl") if need else None
+                with open(path + ".json") as f:
+                    meta = json.load(f)
+                row = {"stage": name, "status": "hit", "seconds": time.perf_counter() - start,
+                       "saved": meta["seconds"]}
+            else:
+                args = [resolve(dep) for dep in stage.inputs]
+                start = time.perf_counter()
+                value = stage.func(*args, **stage.params)
+                seconds = time.perf_counter() - start
+                path = self._path(name, keys[name])
+                #Write then rename, so that an interrupted run never leaves a partial entry
+                joblib.dump(value, path + ".pkl.tmp")
+                os.replace(path + ".pkl.tmp", path + ".pkl")
+                with open(path + ".json", "w") as f:
+                    json.dump({"stage": name, "key": keys[name], "seconds": seconds}, f)
+                row = {"stage": name, "status": "run", "seconds": seconds, "saved": 0.0}
+            #A cached stage first checked without loading may be loaded later by a dependent stage
+            if any(previous["stage"] == name for previous in report):
+                values[name] = value
+                return value
+            report.append(row)
+            if verbose:
+                print("{:<45} {:>4}  {:8.3f}s{}".format(name, row["status"], row["seconds"],
+                      "  (saved {:.3f}s)".format(row["saved"]) if row["status"] == "hit" else ""), flush=True)
+            if need or path is None:
+                values[name] = value
+            return value
+
+        for name in targets:
+            resolve(name, load)
+        return {name: values.get(name) for name in targets}, pd.DataFrame(report)
+
+
+#The stages of the analysis
+
+def load(path):
+    return ckd_common.load_data(path)
+
+
+def clean(raw):
+    return ckd_common.clean(raw.copy())
+
+
+def transform(data, transformer):
+    """Numerical features through `transformer`, categorical ones and target as they are."""
+    out = data.copy()
+    out[ckd_common.numeric] = ckd_common.make_transformers()[transformer].fit_transform(data[ckd_common.numeric])
+    return out
+
+
+def impute(data, n_neighbors, weights):
+    imputed = KNNImputer(weights=weights, n_neighbors=n_neighbors).fit_transform(data)
+    return pd.DataFrame(imputed, columns=data.columns)
+
+
+def eda_stats(data):
+    """The numbers behind the EDA plots."""
+    numeric, categoricals, target = ckd_common.numeric, ckd_common.categoricals, ckd_common.target
+    return {"missing": data.isnull().mean().sort_values(ascending=False),
+            "describe": data[numeric].describe(),
+            "counts": {col: data[col].value_counts() for col in categoricals + [target]},
+            "crosstabs": {(a, b): pd.crosstab(data[a], data[b]) for a in categoricals for b in categoricals},
+            "vs_target": {col: pd.crosstab(data[col], data[target]) for col in categoricals},
+            "correlation": data[numeric].corr("pearson")}
+
+
+def split(imputed, test_size, random_state):
+    """Wide-robust-scaled features, split as in the script."""
+    X = imputed.drop(columns=ckd_common.target).to_numpy()
+    Y = imputed[ckd_common.target].to_numpy()
+    scaled = RobustScaler(quantile_range=(15,85)).fit_transform(X)
+    X_train, X_test, Y_train, Y_test = train_test_split(scaled, Y, test_size=test_size, random_state=random_state)
+    return {"scaled": scaled, "Y": Y, "X_train": X_train, "X_test": X_test, "Y_train": Y_train, "Y_test": Y_test}
+
+
+def pca_sweep(data, max_components):
+    """PCA -> LDA -> linear SVC for every number of components (fitted on training data only)."""
+    rows = []
+    for n_comps in range(1, max_components + 1):
+        pipe = make_pipeline(PCA(n_components=n_comps), LinearDiscriminantAnalysis(), SVC(kernel='linear'))
+        pipe.fit(data["X_train"], data["Y_train"])
+        rows.append({"n_components": n_comps,
+                     "train_accuracy": accuracy_score(pipe.predict(data["X_train"]), data["Y_train"]),
+                     "test_accuracy": accuracy_score(pipe.predict(data["X_test"]), data["Y_test"])})
+    return pd.DataFrame(rows)
+
+
+def model_grid(data, model, max_components):
+    """Training/testing accuracy of PCA -> `model` for every number of components."""
+    rows = []
+    for n_comps in range(1, max_components + 1):
+        pipe = make_pipeline(PCA(n_components=n_comps), ckd_common.make_models()[model])
+        pipe.fit(data["X_train"], data["Y_train"])
+        rows.append({"n_components": n_comps,
+                     "train_accuracy": accuracy_score(pipe.predict(data["X_train"]), data["Y_train"]),
+                     "test_accuracy": accuracy_score(pipe.predict(data["X_test"]), data["Y_test"])})
+    return pd.DataFrame(rows)
+
+
+def boosting(data, model):
+    booster = ckd_common.make_boost_models()[model]
+    booster.fit(data["X_train"], data["Y_train"])
+    return booster.score(data["X_test"], data["Y_test"])
+
+
+@ckd_executor.uses_global_rng
+def nn_point(scaled, Y, n_components, test_size, random_state, seed=None):
+    """The little and big Keras networks of the script on `n_components` PCA components (one row each).
+
+    `seed` goes to Keras' global set_random_seed, hence the executor marking.
+    """
+    from tensorflow.keras.layers import Dense
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.callbacks import EarlyStopping
+    from tensorflow.keras.utils import set_random_seed, to_categorical
+
+    if seed is not None:
+        set_random_seed(seed)
+    Y_net = to_categorical(Y)
+    X_pca = PCA(n_components=n_components).fit_transform(scaled)
+    X_pca_train, X_pca_test, Y_train, Y_test = train_test_split(X_pca, Y_net, test_size=test_size,
+                                                                random_state=random_state)
+    rows = []
+    for net_name, layers, epochs in [("little", [4], 50), ("big", [50, 30, 20, 10], 100)]:
+        net = Sequential()
+        net.add(Dense(layers[0], activation='relu', input_shape=(n_components,)))
+        for units in layers[1:]:
+            net.add(Dense(units, activation='relu'))
+        net.add(Dense(2, activation='softmax'))
+        net.compile(optimizer='adam', loss='binary_crossentropy', metrics=['accuracy'])
+        net.fit(X_pca_train, Y_train, epochs=epochs,
+                callbacks=[EarlyStopping(patience=5, monitor='accuracy')], verbose=0)
+        rows.append({"net": net_name, "n_components": n_components,
+                     "train_accuracy": accuracy_score(np.argmax(net.predict(X_pca_train, verbose=0), axis=1),
+                                                      Y_train[:, 1]),
+                     "test_accuracy": accuracy_score(np.argmax(net.predict(X_pca_test, verbose=0), axis=1),
+                                                     Y_test[:, 1])})
+    return rows
+
+
+def nn(data, max_components, test_size, random_state, seed):
+    """The little and big Keras networks of the script over the PCA sweep.
+
+    Each point is seeded like the script's executor seeds its NN sweep tasks, so that cached and
+    recomputed results agree.
+    """
+    rows = []
+    for i in range(1, max_components + 1):
+        rows += nn_point(data["scaled"], data["Y"], i, test_size, random_state,
+                         seed=ckd_executor.task_seed(seed, i - 1))
+    return pd.DataFrame(rows)
+
+
+def build_pipeline(path="chronic_kidney_disease.csv", cache_dir=".ckd_cache/stages", nets=True,
+                   max_components=24, test_size=0.2, random_state=12, seed=0):
+    """The analysis as a StageGraph."""
+    graph = StageGraph(cache_dir)
+    graph.add("load", load, files=[path], depends_on=[ckd_common.load_data], path=path)
+    graph.add("clean", clean, ["load"], depends_on=[ckd_common.fix_typos, ckd_common.encode, ckd_common.clean])
+    graph.add("eda_stats", eda_stats, ["clean"])
+
+    graph.add("impute/Original", impute, ["clean"], n_neighbors=8, weights='distance')
+    for index, tr_name in enumerate(ckd_common.tr_names):
+        graph.add("transform/" + tr_name, transform, ["clean"], depends_on=[ckd_common.make_transformers],
+                  transformer=index)
+        graph.add("impute/" + tr_name, impute, ["transform/" + tr_name], n_neighbors=8, weights='distance')
+
+    graph.add("split", split, ["impute/Original"], test_size=test_size, random_state=random_state)
+    graph.add("pca_sweep", pca_sweep, ["split"], max_components=max_components)
+    for index, name in enumerate(ckd_common.names):
+        graph.add("model_grid/" + name, model_grid, ["split"], depends_on=[ckd_common.make_models],
+                  model=index, max_components=max_components)
+    for index, name in enumerate(ckd_common.boost_names):
+        graph.add("boosting/" + name, boosting, ["split"],
+                  depends_on=[ckd_common.make_boost_models, ckd_common.make_booster], model=index)
+    if nets:
+        #The script splits 75/25 for the networks
+        graph.add("nn", nn, ["split"], depends_on=[nn_point], max_components=max_components, test_size=0.25,
+                  random_state=random_state, seed=seed)
+    return graph
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--data", default="chronic_kidney_disease.csv")
+    parser.add_argument("--cache-dir", default=".ckd_cache/stages")
+    parser.add_argument("--targets", help="regular expression of the stages to bring up to date (default: all)")
+    parser.add_argument("--force", help="regular expression of stages to rerun even if cached")
+    parser.add_argument("--max-components", type=int, default=24)
+    parser.add_argument("--no-nets", action="store_true", help="leave out the Keras stage")
+    parser.add_argument("--seed", type=int, default=0, help="base seed of the Keras networks")
+    args = parser.parse_args(argv)
+
+    nets = not args.no_nets and importlib.util.find_spec("tensorflow") is not None
+    graph = build_pipeline(args.data, args.cache_dir, nets=nets, max_components=args.max_components,
+                           seed=args.seed)
+    targets = None
+    if args.targets:
+        targets = [name for name in graph.stages if re.fullmatch(args.targets, name)]
+        if not targets:
+            parser.error("no stage matches --targets {!r}".format(args.targets))
+
+    start = time.perf_counter()
+    _, report = graph.run(targets, force=args.force, load=False)
+    hits = report[report["status"] == "hit"]
+    print("\n{} stages: {} cache hits, {} executed in {:.2f}s; {:.2f}s saved by the cache".format(
+        len(report), len(hits), len(report) - len(hits), time.perf_counter() - start, hits["saved"].sum()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Memory-mapped store for the dataset variants (untransformed + one per transformer).
+
+All variants live in a single (variant, row, feature) float32 array backed by
+a .npy file, instead of a list of arrays plus a list of DataFrames built from
+them. Variants are written one at a time, and readers get zero-copy views:
+
+    store = TensorStore.create("imputed", ['Original'] + tr_names, data.columns, data.shape[0])
+    store.write('Robust Scaler', imputed_array)
+    store.series('Robust Scaler', 'Age (yrs)')   #named Series over the mapped column
+    store.frame('Robust Scaler')                 #DataFrame over the mapped variant
+
+so the memory held by the process grows with one variant at a time; the
+operating system pages the rest in and out of the file as needed.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+default_dir = os.path.join(".ckd_cache", "store")
+
+
+class TensorStore:
+    """A (variant, row, feature) float32 array memory-mapped from `path`."""
+
+    def __init__(self, path, array, variants, columns):
+        self.path = path
+        self.array = array
+        self.variants = list(variants)
+        self.columns = list(columns)
+        self._variant_index = {name: i for i, name in enumerate(self.variants)}
+        self._column_index = {name: j for j, name in enumerate(self.columns)}
+
+    @classmethod
+    def create(cls, name, variants, columns, n_rows, directory=default_dir):
+        """A new store filled with NaN (the file is overwritten if it exists)."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, name + ".npy")
+        variants, columns = list(variants), list(columns)
+        array = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32,
+                                          shape=(len(variants), n_rows, len(columns)))
+        array[:] = np.nan
+        with open(path[:-len(".npy")] + ".json", "w") as f:
+            json.dump({"variants": variants, "columns": columns}, f)
+        return cls(path, array, variants, columns)
+
+    @classmethod
+    def open(cls, path, mode="r"):
+        """Reopens a store written by `create` (read-only by default)."""
+        array = np.load(path, mmap_mode=mode)
+        with open(path[:-len(".npy")] + ".json") as f:
+            names = json.load(f)
+        return cls(path, array, names["variants"], names["columns"])
+
+    def _variant(self, variant):
+        return variant if isinstance(variant, (int, np.integer)) else self._variant_index[variant]
+
+    def _columns(self, columns):
+        return [self._column_index[col] for col in columns]
+
+    @property
+    def shape(self):
+        return self.array.shape
+
+    def write(self, variant, values, columns=None):
+        """Writes a (row, feature) array or DataFrame into `variant` (optionally only some columns)."""
+        if isinstance(values, (pd.DataFrame, pd.Series)):
+            values = values.to_numpy()
+        target = self.array[self._variant(variant)]
+        if columns is None:
+            target[:] = values
+        else:
+            target[:, self._columns(columns)] = np.asarray(values).reshape(target.shape[0], -1)
+
+    def variant(self, variant):
+        """Zero-copy (row, feature) view of one variant."""
+        return self.array[self._variant(variant)]
+
+    def feature(self, variant, column):
+        """Zero-copy view of one feature of one variant."""
+        return self.array[self._variant(variant), :, self._column_index[column]]
+
+    def series(self, variant, column):
+        """`feature` as a Series named after the column (what the plots expect)."""
+        return pd.Series(self.feature(variant, column), name=column, copy=False)
+
+    def frame(self, variant):
+        """`variant` as a DataFrame with the store's columns, without copying."""
+        return pd.DataFrame(self.variant(variant), columns=self.columns, copy=False)
+
+    def flush(self):
+        if hasattr(self.array, "flush"):
+            self.array.flush()
+
+    def close(self, delete=False):
+        """Flushes and releases the mapping; `delete` also removes the files."""
+        self.flush()
+        self.array = None
+        if delete:
+            os.remove(self.path)
+            os.remove(self.path[:-len(".npy")] + ".json")
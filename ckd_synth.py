@@ -0,0 +1,180 @@
+"""Synthetic CKD cohorts of arbitrary size, for load testing.
+
+A CohortModel is fitted on the raw UCI file and learns, per column:
+- the marginal distribution (empirical quantiles for continuous features,
+  value frequencies for ordinal and categorical ones),
+- the missingness rate and the missing-value tokens ('?', '\\t?'...),
+- the typo tokens ('\\tyes', 'ckd\\t', '\\t6200'...) and how often they occur,
+and the correlations between the (cleaned) features, through a Gaussian
+copula on their normal scores (correlations involving binary features come
+out somewhat weaker than in the real data, as usual with this copula).
+
+Samples are written in the raw format of the UCI file (no header, same
+tokens), so that `pd.read_csv(path, names=feature_names)` and the cleaning
+code handle them exactly like the real data. Rows are generated and written
+in chunks; a given (seed, chunk size) always produces the same file.
+
+Usage:
+    python ckd_synth.py --rows 1000000 --out synthetic_ckd.csv --seed 0
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr, ndtri
+
+import ckd_common
+
+missing_tokens = ('?', '\t?', '')
+
+#Columns with at most this many distinct values are sampled from their observed values
+max_discrete_values = 20
+
+
+def read_raw(path="chronic_kidney_disease.csv"):
+    """The raw tokens of a CKD file, as strings."""
+    return pd.read_csv(path, names=ckd_common.feature_names, dtype=str, keep_default_na=False)
+
+
+def _decimals(token):
+    token = token.strip()
+    return len(token) - token.index('.') - 1 if '.' in token else 0
+
+
+class ColumnModel:
+    """Marginal distribution, missingness and typos of one raw column."""
+
+    def fit(self, tokens, codes):
+        """`tokens` are the raw strings, `codes` the cleaned values (NaN when missing)."""
+        n = len(tokens)
+        counts = tokens.value_counts()
+        missing = counts[counts.index.isin(missing_tokens)]
+        self.missing_rate = missing.sum() / n
+        self.missing_tokens = np.array(missing.index, dtype=object)
+        self.missing_probs = (missing / missing.sum()).to_numpy() if len(missing) else np.array([])
+
+        observed = codes[~np.isnan(codes)]
+        self.values, value_counts = np.unique(observed, return_counts=True)
+        self.discrete = len(self.values) <= max_discrete_values
+        present = counts[~counts.index.isin(missing_tokens)]
+        #Typos of continuous columns ('\t43'...) are emitted verbatim at their observed rate
+        typos = [] if self.discrete else [token for token in present.index if token != token.strip()]
+        self.typo_rate = present[typos].sum() / present.sum() if typos else 0.0
+        self.typo_tokens = np.array(typos, dtype=object)
+        self.typo_probs = (present[typos] / present[typos].sum()).to_numpy() if typos else np.array([])
+        if self.discrete:
+            self.cum_probs = np.cumsum(value_counts) / value_counts.sum()
+        else:
+            #Quantiles of the correctly spelled values only, the typos being drawn separately
+            self.sorted_values = np.sort(codes[~np.isnan(codes) & ~tokens.isin(typos).to_numpy()])
+        self.decimals = max([_decimals(token) for token in present.index] + [0])
+
+        #Raw spellings of each discrete value ('yes', '\tyes', ' yes'...) and their frequencies
+        self.spellings = []
+        if self.discrete:
+            token_codes = pd.Series(codes, index=tokens.to_numpy()).groupby(level=0).first()
+            for value in self.values:
+                freqs = present[token_codes[present.index].to_numpy() == value]
+                self.spellings.append((np.array(freqs.index, dtype=object), (freqs / freqs.sum()).to_numpy()))
+        return self
+
+    def sample(self, u, rng):
+        """Raw tokens for uniform scores `u` (one per row)."""
+        n = len(u)
+        out = np.empty(n, dtype=object)
+        if self.discrete:
+            index = np.minimum(np.searchsorted(self.cum_probs, u, side='right'), len(self.values) - 1)
+            for k, (spellings, probs) in enumerate(self.spellings):
+                rows = np.flatnonzero(index == k)
+                if len(rows) == 0:
+                    continue
+                if len(spellings) == 1:
+                    out[rows] = spellings[0]
+                else:
+                    out[rows] = spellings[rng.choice(len(spellings), size=len(rows), p=probs)]
+        else:
+            position = u * (len(self.sorted_values) - 1)
+            values = np.interp(position, np.arange(len(self.sorted_values)), self.sorted_values)
+            out[:] = np.char.mod("%.{}f".format(self.decimals), np.round(values, self.decimals)).astype(object)
+            if self.typo_rate:
+                rows = np.flatnonzero(rng.random(n) < self.typo_rate)
+                out[rows] = self.typo_tokens[rng.choice(len(self.typo_tokens), size=len(rows), p=self.typo_probs)]
+
+        if self.missing_rate:
+            rows = np.flatnonzero(rng.random(n) < self.missing_rate)
+            out[rows] = self.missing_tokens[rng.choice(len(self.missing_tokens), size=len(rows),
+                                                       p=self.missing_probs)]
+        return out
+
+
+class CohortModel:
+    """Joint model of a raw CKD file: per-column models tied by a Gaussian copula."""
+
+    def fit(self, raw):
+        clean = ckd_common.encode(ckd_common.fix_typos(raw.copy()))[ckd_common.feature_names]
+        self.columns = list(ckd_common.feature_names)
+        self.models = [ColumnModel().fit(raw[col], clean[col].to_numpy(dtype=float)) for col in self.columns]
+
+        #Normal scores of the (mid-)ranks of the observed values, then their pairwise correlations
+        scores = clean.rank(method='average').div(clean.notna().sum() + 1)
+        scores = scores.apply(lambda s: pd.Series(ndtri(s.to_numpy(dtype=float)), index=s.index))
+        corr = scores.corr().fillna(0).to_numpy(copy=True)
+        np.fill_diagonal(corr, 1)
+        #Pairwise correlations need not be positive definite: clip the spectrum
+        eigvals, eigvecs = np.linalg.eigh(corr)
+        corr = eigvecs @ np.diag(np.clip(eigvals, 1e-6, None)) @ eigvecs.T
+        d = np.sqrt(np.diag(corr))
+        self.correlation = corr / np.outer(d, d)
+        self.cholesky = np.linalg.cholesky(self.correlation)
+        return self
+
+    def sample(self, n_rows, rng):
+        """A DataFrame of `n_rows` raw rows."""
+        z = rng.standard_normal((n_rows, len(self.columns))) @ self.cholesky.T
+        u = ndtr(z)
+        return pd.DataFrame({col: model.sample(u[:, k], rng)
+                             for k, (col, model) in enumerate(zip(self.columns, self.models))})
+
+
+def fit(path="chronic_kidney_disease.csv"):
+    return CohortModel().fit(read_raw(path))
+
+
+def generate_frame(model, n_rows, seed=0):
+    """Raw synthetic rows in memory (what `pd.read_csv(..., dtype=str)` would return)."""
+    return model.sample(n_rows, np.random.default_rng(seed))
+
+
+def write_csv(model, path, n_rows, seed=0, chunk_size=500000, verbose=False):
+    """Streams `n_rows` synthetic rows to `path`, `chunk_size` rows at a time."""
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    written = 0
+    with open(path, "w", newline="") as f:
+        while written < n_rows:
+            size = min(chunk_size, n_rows - written)
+            model.sample(size, rng).to_csv(f, header=False, index=False)
+            written += size
+            if verbose:
+                print("{:,} / {:,} rows ({:.1f}s)".format(written, n_rows, time.perf_counter() - start))
+    return written
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--source", default="chronic_kidney_disease.csv", help="real file to learn from")
+    parser.add_argument("--out", default="synthetic_ckd.csv")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--chunk-size", type=int, default=500000)
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args(argv)
+
+    model = fit(args.source)
+    write_csv(model, args.out, args.rows, args.seed, args.chunk_size, verbose=not args.quiet)
+
+
+if __name__ == "__main__":
+    main()
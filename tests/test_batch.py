@@ -0,0 +1,34 @@
+import os
+import time
+
+import ckd_batch
+
+
+def fake_cohort(path, name, options):
+    #Forked workers see this in place of run_cohort; the "bad" cohort kills its worker every time
+    time.sleep(0.2)
+    if "bad" in os.path.basename(path):
+        os._exit(1)
+    return {"cohort": name, "path": path, "pid": os.getpid()}
+
+
+def test_a_dying_worker_only_fails_its_own_cohort(tmp_path, monkeypatch):
+    monkeypatch.setattr(ckd_batch, "run_cohort", fake_cohort)
+    paths = []
+    for name in ["a", "b", "bad", "c"]:
+        path = tmp_path / (name + ".csv")
+        path.write_text("x")
+        paths.append(str(path))
+
+    outputs = ckd_batch.run_batch(paths, {}, workers=4, memory_limit=float("inf"), verbose=False)
+    outcomes = {os.path.basename(out["path"]): ("error" in out, out["attempts"]) for out in outputs}
+    assert outcomes["bad.csv"] == (True, 3)
+    assert all(not failed for name, (failed, _) in outcomes.items() if name != "bad.csv")
+    assert len(outputs) == 4
+
+
+def test_cohort_names_tell_same_named_files_apart():
+    paths = ["/data/sites/a/cohort.csv", "/data/sites/b/cohort.csv", "/data/sites/b/extra.csv"]
+    assert list(ckd_batch.cohort_names(paths).values()) == ["a/cohort", "b/cohort", "b/extra"]
+    assert ckd_batch.cohort_names(["/data/one.csv"]) == {"/data/one.csv": "one"}
+    assert list(ckd_batch.cohort_names(["/d/x.csv", "/d/x.CSV"]).values()) == ["x.csv", "x.CSV"]
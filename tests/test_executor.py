@@ -0,0 +1,98 @@
+import operator
+import os
+import time
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_classification
+from sklearn.ensemble import RandomForestClassifier
+
+import ckd_executor
+from ckd_executor import TaskError
+
+
+#Socket workers are separate interpreters: the tasks of every backend are stdlib or project functions
+@pytest.fixture(scope="module", params=ckd_executor.backends)
+def executor(request):
+    with ckd_executor.make_executor(request.param, 2) as executor:
+        yield executor
+
+
+def test_results_come_back_in_task_order(executor):
+    assert executor.map(pow, [(2, i) for i in range(20)]) == [2 ** i for i in range(20)]
+    assert list(executor.imap(operator.neg, ((i,) for i in range(7)))) == [-i for i in range(7)]
+
+
+def test_every_task_gets_its_own_reproducible_seed(executor):
+    seeds = [result["seed"] for result in executor.map(dict, [()] * 6, seed=3)]
+    assert seeds == [ckd_executor.task_seed(3, index) for index in range(6)]
+    assert len(set(seeds)) == 6
+    assert executor.map(dict, [()] * 2) == [{}, {}]
+
+
+def test_seeded_fits_match_the_serial_backend(executor):
+    X, Y = make_classification(n_samples=120, n_features=6, random_state=0)
+    tasks = [(RandomForestClassifier(n_estimators=5, max_features=2), X[:80], Y[:80], X[80:], Y[80:])] * 4
+    expected = ckd_executor.make_executor("serial").map(ckd_executor.fit_score, tasks, seed=7)
+    assert executor.map(ckd_executor.fit_score, tasks, seed=7) == expected
+
+
+def test_failure_raises_task_error(executor):
+    with pytest.raises(TaskError, match="(?s)Division #1 failed.*ZeroDivisionError"):
+        executor.map(operator.truediv, [(1, 1), (1, 0), (2, 1)], name="Division")
+
+
+def test_timings_label_every_task(executor):
+    executor.map(pow, [(2, 1), (2, 2)], name="Labelled", tags=[{"k": "a"}, {"k": "b"}], rows=[10, 20])
+    timings = executor.timings()
+    timings = timings[timings["name"] == "Labelled"]
+    assert list(timings["k"]) == ["a", "b"]
+    assert list(timings["rows"]) == [10, 20]
+    assert set(timings["backend"]) == {executor.name}
+
+
+def test_imap_pulls_tasks_lazily_and_collects_them_on_early_stop():
+    pulled = []
+
+    def tasks():
+        for i in range(100):
+            pulled.append(i)
+            yield (i,)
+
+    with ckd_executor.make_executor("threads", 2) as executor:
+        results = executor.imap(operator.neg, tasks(), name="Lazy")
+        assert next(results) == 0
+        assert len(pulled) <= 3
+        results.close()
+        assert len(executor.timings()) == len(pulled)
+
+
+running = []
+overlaps = []
+
+
+@ckd_executor.uses_global_rng
+def draw(seed=None):
+    running.append(seed)
+    overlaps.append(len(running))
+    first = np.random.random()
+    time.sleep(0.01)
+    running.remove(seed)
+    return first + np.random.random()
+
+
+def test_global_rng_tasks_run_alone_in_threads():
+    overlaps.clear()
+    expected = ckd_executor.make_executor("serial").map(draw, [()] * 8, seed=1)
+    with ckd_executor.make_executor("threads", 4) as executor:
+        assert executor.map(draw, [()] * 8, seed=1) == expected
+    assert max(overlaps) == 1
+
+
+
+def test_a_task_killing_its_socket_worker_fails_by_name():
+    with ckd_executor.make_executor("socket", 2) as executor:
+        with pytest.raises(TaskError, match="(?s)Crash #0 failed.*3 attempts"):
+            executor.map(os._exit, [(1,)], name="Crash")
+        #The dead workers were replaced
+        assert executor.map(pow, [(2, i) for i in range(4)]) == [1, 2, 4, 8]
@@ -0,0 +1,118 @@
+import pytest
+
+import ckd_common
+import ckd_stages
+from ckd_stages import StageGraph
+
+calls = []
+#Stages log their calls through a method, so that the log itself is not part of their cache key
+record = calls.append
+
+
+def source(value):
+    record("source")
+    return value
+
+
+def double(x, factor):
+    record("double")
+    return x * factor
+
+
+def total(a, b):
+    record("total")
+    return a + b
+
+
+def build(cache_dir, factor=2):
+    graph = StageGraph(str(cache_dir))
+    graph.add("source", source, value=3)
+    graph.add("double", double, ["source"], factor=factor)
+    graph.add("total", total, ["source", "double"])
+    return graph
+
+
+@pytest.fixture(autouse=True)
+def reset_calls():
+    calls.clear()
+
+
+def statuses(report):
+    return dict(zip(report["stage"], report["status"]))
+
+
+def test_rerun_hits_the_cache(tmp_path):
+    outputs, report = build(tmp_path).run(verbose=False)
+    assert outputs == {"source": 3, "double": 6, "total": 9}
+    assert set(statuses(report).values()) == {"run"}
+
+    calls.clear()
+    outputs, report = build(tmp_path).run(verbose=False)
+    assert outputs == {"source": 3, "double": 6, "total": 9}
+    assert set(statuses(report).values()) == {"hit"}
+    assert calls == []
+
+
+def test_param_change_reruns_the_stage_and_its_dependents_only(tmp_path):
+    build(tmp_path).run(verbose=False)
+    calls.clear()
+    outputs, report = build(tmp_path, factor=5).run(verbose=False)
+    assert outputs["total"] == 18
+    assert statuses(report) == {"source": "hit", "double": "run", "total": "run"}
+    assert calls == ["double", "total"]
+
+
+def test_force_reruns_matching_stages(tmp_path):
+    build(tmp_path).run(verbose=False)
+    calls.clear()
+    _, report = build(tmp_path).run(["double"], force="double", verbose=False)
+    assert statuses(report) == {"source": "hit", "double": "run"}
+    assert calls == ["double"]
+
+
+def test_file_content_is_part_of_the_key(tmp_path):
+    path = tmp_path / "input.csv"
+    path.write_text("a")
+    graph = StageGraph(str(tmp_path / "cache"))
+    graph.add("source", source, files=[str(path)], value=1)
+    before = graph.keys()["source"]
+    path.write_text("b")
+    assert graph.keys()["source"] != before
+
+
+def test_load_false_does_not_read_cached_targets(tmp_path):
+    build(tmp_path).run(verbose=False)
+    outputs, report = build(tmp_path).run(["total"], load=False, verbose=False)
+    assert outputs == {"total": None}
+    assert statuses(report) == {"total": "hit"}
+
+
+def test_undeclared_input_is_rejected(tmp_path):
+    graph = StageGraph(str(tmp_path))
+    with pytest.raises(ValueError):
+        graph.add("double", double, ["source"], factor=2)
+
+
+def test_editing_a_shared_constant_invalidates_the_stages_using_it(tmp_path, monkeypatch):
+    path = tmp_path / "ckd.csv"
+    path.write_text("raw")
+    before = ckd_stages.build_pipeline(str(path), str(tmp_path), nets=False).keys()
+    monkeypatch.setitem(ckd_common.typo_fixes[16], '\t8400', '8400')
+    after = ckd_stages.build_pipeline(str(path), str(tmp_path), nets=False).keys()
+    assert after["load"] == before["load"]
+    for name in ["clean", "split", "impute/Original", "model_grid/SVM_RBF"]:
+        assert after[name] != before[name]
+
+
+def test_editing_a_helper_changes_the_code_digest(monkeypatch):
+    before = ckd_common.code_digest(ckd_stages.clean)
+    monkeypatch.setitem(ckd_common.encodings, 'poor', 2)
+    assert ckd_common.code_digest(ckd_stages.clean) != before
+
+
+def test_the_nn_seed_is_part_of_its_key(tmp_path):
+    path = tmp_path / "ckd.csv"
+    path.write_text("raw")
+    before = ckd_stages.build_pipeline(str(path), str(tmp_path), seed=0).keys()
+    after = ckd_stages.build_pipeline(str(path), str(tmp_path), seed=1).keys()
+    assert [name for name in before if after[name] != before[name]] == ["nn"]